@@ -0,0 +1,203 @@
+from collections import deque
+from contextlib import contextmanager
+import math
+import threading
+import time
+import metrics
+
+
+# Per-provider Concurrency Caps (process-wide, shared by every session)
+PROVIDER_LIMITS = {
+    "cloudflare": 4,
+    "replicate": 4,
+    "openai": 2,
+    "diffusers": 1,
+}
+DEFAULT_LIMIT = 8
+
+# Per-user Budget (token bucket: one token per provider call, a short burst,
+# then one call per 1/RATE s; the burst fits a 7-style comparison)
+USER_RATE = 0.1  # tokens per second
+USER_BURST = 8
+BUCKET_IDLE = USER_BURST / USER_RATE  # idle this long = full again: drop it
+
+# Seconds between cancel checks while a call waits in the queue
+CANCEL_POLL = 0.1
+
+# Wait Estimates (seconds per call until real calls have been timed)
+SERVICE_SECONDS = 10.0
+SERVICE_SMOOTHING = 0.2  # weight of the latest call in the moving average
+
+
+class TokenBucket:
+    def __init__(self, rate=USER_RATE, capacity=USER_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, amount=1):
+        # -> 0.0 when granted, else seconds until the tokens will be there
+        # (inf for more than a full bucket: such a batch is never admitted)
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if amount > self.capacity:
+            return math.inf
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class Ticket:
+    # One provider call waiting for (then holding) a concurrency slot
+    def __init__(self, provider, user=None):
+        self.provider = provider
+        self.user = user
+        self.state = "queued"  # queued -> admitted -> released, or canceled
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+        self._admitted = threading.Event()
+
+    @property
+    def admitted(self):
+        return self._admitted.is_set()
+
+    def wait(self, timeout=None):
+        return self._admitted.wait(timeout)
+
+
+class AdmissionController:
+    # FIFO queue per provider in front of its concurrency cap: calls past the
+    # cap wait their turn in arrival order instead of provoking 429 retries
+    def __init__(self, limits=PROVIDER_LIMITS, default_limit=DEFAULT_LIMIT):
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self._queues = {}
+        self._active = {}
+        self._service = {}
+        self._buckets = {}
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def limit(self, provider):
+        return self.limits.get(provider, self.default_limit)
+
+    def charge(self, user, amount=1):
+        # -> 0.0 if the user may go ahead, else seconds to wait
+        with self._lock:
+            now = time.monotonic()
+            if now - self._pruned_at > BUCKET_IDLE:
+                # A bucket idle since its last refill is as good as a new one
+                self._pruned_at = now
+                self._buckets = {
+                    key: bucket
+                    for key, bucket in self._buckets.items()
+                    if now - bucket.updated < BUCKET_IDLE
+                }
+            bucket = self._buckets.setdefault(user, TokenBucket())
+            retry_after = bucket.take(amount)
+        if retry_after:
+            metrics.RATE_LIMITED.inc()
+        return retry_after
+
+    def enqueue(self, provider, user=None):
+        ticket = Ticket(provider, user)
+        with self._lock:
+            self._queues.setdefault(provider, deque()).append(ticket)
+            self._admit(provider)
+        return ticket
+
+    def _admit(self, provider):
+        queue = self._queues.setdefault(provider, deque())
+        while queue and self._active.get(provider, 0) < self.limit(provider):
+            ticket = queue.popleft()
+            self._active[provider] = self._active.get(provider, 0) + 1
+            ticket.state = "admitted"
+            ticket.admitted_at = time.monotonic()
+            ticket._admitted.set()
+        metrics.ADMISSION_QUEUE.set(len(queue), provider=provider)
+        metrics.ADMISSION_ACTIVE.set(self._active.get(provider, 0), provider=provider)
+
+    def release(self, ticket):
+        # Idempotent: frees the slot (or leaves the queue) and admits the next
+        provider = ticket.provider
+        with self._lock:
+            if ticket.state == "queued":
+                self._queues[provider].remove(ticket)
+                ticket.state = "canceled"
+            elif ticket.state == "admitted":
+                self._active[provider] -= 1
+                ticket.state = "released"
+                seconds = time.monotonic() - ticket.admitted_at
+                previous = self._service.get(provider, SERVICE_SECONDS)
+                self._service[provider] = previous + SERVICE_SMOOTHING * (
+                    seconds - previous
+                )
+            else:
+                return
+            self._admit(provider)
+
+    def position(self, ticket):
+        # 0 = next in line; None once admitted (or gone)
+        with self._lock:
+            queue = self._queues.get(ticket.provider, ())
+            for index, queued in enumerate(queue):
+                if queued is ticket:
+                    return index
+        return None
+
+    def estimated_wait(self, provider, position=None):
+        # Seconds until a slot frees for `position` (default: a new arrival)
+        with self._lock:
+            if position is None:
+                position = len(self._queues.get(provider, ()))
+                if self._active.get(provider, 0) < self.limit(provider):
+                    return 0.0
+            service = self._service.get(provider, SERVICE_SECONDS)
+        return (position // self.limit(provider) + 1) * service
+
+    @contextmanager
+    def slot(self, provider, user=None, cancel_event=None):
+        # Usage: with controller.slot("replicate"): ... (blocks in FIFO order;
+        # once cancel_event is set the call leaves the queue instead of starting)
+        ticket = self.enqueue(provider, user)
+        try:
+            while not ticket.wait(None if cancel_event is None else CANCEL_POLL):
+                if cancel_event.is_set():
+                    break
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError(f"Canceled while waiting for {provider}")
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self):
+        with self._lock:
+            providers = sorted(set(self.limits) | set(self._queues))
+            return [
+                {
+                    "provider": provider,
+                    "active": self._active.get(provider, 0),
+                    "limit": self.limit(provider),
+                    "queued": len(self._queues.get(provider, ())),
+                    "service_seconds": self._service.get(provider, SERVICE_SECONDS),
+                }
+                for provider in providers
+            ]
+
+
+# Process-wide Admission Controller (every session, job and worker thread)
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
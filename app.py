@@ -1,10 +1,16 @@
-from dotenv import dotenv_values
-from PIL import Image
-from requests_toolbelt.multipart.encoder import MultipartEncoder
-import openai
+import cache
+import core
+import history
+import jobs
+import lut
+import metrics
+import preprocess
+import router
+import settings
+import storage
 import streamlit as st
-import replicate
-import requests
+import time
+import ui
 
 
 # Streamlit App UI
@@ -26,8 +32,10 @@ if "CUSTOM_LOGIN_ID" in st.secrets:
     GPT_MODEL1 = st.secrets["OPENAI_MODEL_TTI"]
     GPT_API_KEY2 = st.secrets["REPLICATE_API_TOKEN"]
     GPT_MODEL2 = st.secrets["REPLICATE_MODEL_ITI"]
+    REPLICATE_API_URL = st.secrets.get("REPLICATE_API_URL")
+    config = st.secrets
 else:
-    config = dotenv_values(".env")
+    config = core.load_config()
     LOGIN_ID = config["CUSTOM_LOGIN_ID"]
     LOGIN_PW = config["CUSTOM_LOGIN_PW"]
     IMAGE_ACCOUNT_ID = config["CLOUDFLARE_ACCOUNT_ID"]
@@ -37,6 +45,10 @@ else:
     GPT_MODEL1 = config["OPENAI_MODEL_TTI"]
     GPT_API_KEY2 = config["REPLICATE_API_TOKEN"]
     GPT_MODEL2 = config["REPLICATE_MODEL_ITI"]
+    REPLICATE_API_URL = config.get("REPLICATE_API_URL")
+
+# Metrics Exporter (/metrics on METRICS_PORT) & JSON Request Log
+metrics.setup(config.get("METRICS_PORT"), config.get("METRICS_LOG"))
 
 
 def login():
@@ -45,27 +57,19 @@ def login():
 
     if username == LOGIN_ID and password == LOGIN_PW:
         st.session_state.logged_in = True
+        # Widget keys are dropped once the login form is gone: keep the name
+        st.session_state.user_id = username
         st.success("✅ Welcome to Cartoonize GPT!")
     else:
         st.warning("Check your Account!")
 
 
-def upload_image_to_storage(image_file):
-    encoder = MultipartEncoder(
-        fields={"file": (image_file.name, image_file, "image/jpeg")}
-    )
-    headers = {
-        "Authorization": f"Bearer {IMAGE_API_KEY}",
-        "Content-Type": encoder.content_type,
-    }
-
-    IMAGE_UPLOAD_URL = f"{IMAGE_API_URL}/{IMAGE_ACCOUNT_ID}/images/v1"
-    response = requests.post(IMAGE_UPLOAD_URL, headers=headers, data=encoder)
-
-    if response.status_code == 200:
-        return response.json()["result"]["variants"][0]
-    else:
-        st.error(f"Failed to upload: {response.text}")
+def upload_image_to_storage(prepared):
+    # Same Cloudflare slot & upload index as the worker/batch paths (core)
+    try:
+        return core.upload_image(config, prepared)
+    except storage.UploadError as e:
+        st.error(f"Failed to upload: {e}")
         return None
 
 
@@ -80,6 +84,15 @@ if not st.session_state.logged_in:
 
         if st.button("LOGIN"):
             login()
+
+    # Warm up SDKs & connections while the user types (login page is already out)
+    settings.warm_up(
+        urls=(IMAGE_API_URL,),
+        tasks=(
+            lambda: jobs.create_client(GPT_API_KEY2, REPLICATE_API_URL),
+            lambda: core.openai_client(config),
+        ),
+    )
     st.stop()
 
 
@@ -93,58 +106,72 @@ with st.sidebar:
         ),
     )
 
-    # Cartoon Style
-    selected_style = st.selectbox(
-        "Choose a Cartoon Style",
-        (
-            "디즈니 | Pixar Disney",
-            "마블 | Marvel Hero",
-            "지브리 | Studio Ghibli",
-            "아이돌 | K-Pop Star",
-            "미정 | User Prompt",
-        ),
-    )
-
-    # Aspect Ratio
-    selected_ratio = (
-        st.selectbox(
-            "Choose a Aspect Ratio",
+    # Generation Settings (a form: slider moves don't rerun the script until applied)
+    with st.form("settings", border=False):
+        # Cartoon Style
+        selected_style = st.selectbox(
+            "Choose a Cartoon Style",
             (
-                "기본(1:1) | 1:1",
-                "가로(4:3) | 4:3",
-                "가로(16:9) | 16:9",
-                "세로(3:4) | 3:4",
-                "세로(9:16) | 9:16",
+                "디즈니 | Pixar Disney",
+                "마블 | Marvel Hero",
+                "지브리 | Studio Ghibli",
+                "아이돌 | K-Pop Star",
+                "미정 | User Prompt",
             ),
         )
-        if selected_input.split(" | ")[1] == "photo"
-        else st.selectbox(
-            "Choose a Aspect Ratio",
+
+        # Aspect Ratio
+        selected_ratio = (
+            st.selectbox(
+                "Choose a Aspect Ratio",
+                (
+                    "기본(1:1) | 1:1",
+                    "가로(4:3) | 4:3",
+                    "가로(16:9) | 16:9",
+                    "세로(3:4) | 3:4",
+                    "세로(9:16) | 9:16",
+                ),
+            )
+            if selected_input.split(" | ")[1] == "photo"
+            else st.selectbox(
+                "Choose a Aspect Ratio",
+                (
+                    "기본(1:1) | 1024x1024",
+                    "가로(16:9) | 1792x1024",
+                    "세로(9:16) | 1024x1792",
+                ),
+            )
+        )
+
+        # Photo Provider (auto routes to the fastest healthy backend)
+        selected_provider = st.selectbox(
+            "Choose a Provider",
             (
-                "기본(1:1) | 1024x1024",
-                "가로(16:9) | 1792x1024",
-                "세로(9:16) | 1024x1792",
+                "레플리케이트 | replicate",
+                "자동 | auto",
+                "클래식(로컬) | classic",
             ),
         )
-    )
 
-    # Transformation Strength (how many change - image)
-    selected_change = st.slider(
-        "Adjust a Transformation Strength",
-        min_value=0.1,
-        max_value=0.9,
-        step=0.05,
-        value=0.75,  # default
-    )
+        # Transformation Strength (how many change - image)
+        selected_change = st.slider(
+            "Adjust a Transformation Strength",
+            min_value=0.1,
+            max_value=0.9,
+            step=0.05,
+            value=0.75,  # default
+        )
 
-    # Guidance Scale (how to draw - prompt)
-    selected_scale = st.slider(
-        "Adjust a Guidance Scale",
-        min_value=1,
-        max_value=15,
-        step=1,
-        value=10,  # natural (5~6), strong (9~12)
-    )
+        # Guidance Scale (how to draw - prompt)
+        selected_scale = st.slider(
+            "Adjust a Guidance Scale",
+            min_value=1,
+            max_value=15,
+            step=1,
+            value=10,  # natural (5~6), strong (9~12)
+        )
+
+        st.form_submit_button("Apply", use_container_width=True)
 
     # Link to Github Repo
     st.markdown("---")
@@ -168,98 +195,242 @@ else:
     )
 
     # Define Assistant Prompt
-    assistant_prompt = ""
-    if drawing_style[1] == "Pixar Disney":
-        assistant_prompt = "A charming animated character in the style of classic Disney movies, with large expressive eyes, soft facial features, a whimsical and friendly smile, elegant proportions, smooth and clean line art, colorful and polished look, magical fairy-tale costume, warm and glowing lighting, set in a dreamy fantasy background, capturing the spirit of innocence and wonder,"
-    elif drawing_style[1] == "Marvel Hero":
-        assistant_prompt = "A powerful superhero character in the style of Marvel Comics, wearing a futuristic, high-tech suit with glowing elements, dynamic pose, detailed musculature, dramatic lighting, cinematic shadows, vibrant color palette, comic book realism, heroic expression, action-packed background, intense atmosphere, inspired by characters like Iron Man, Spider-Man, and Captain Marvel,"
-        selected_change = 0.5
-    elif drawing_style[1] == "Studio Ghibli":
-        assistant_prompt = "A dreamy, hand-painted fantasy scene inspired by Studio Ghibli, rendered in soft pastel tones. Lush, gently swaying grass fields, delicate wildflowers, and a small child with a curious gaze standing beneath a wide, cloud-filled sky. Warm, golden sunlight filtering through the clouds, creating a peaceful, nostalgic mood. Light watercolor textures, painterly brushstrokes, and subtle glowing dust particles in the air. Whimsical creatures or forest spirits watching from afar, evoking a sense of magic and wonder. Inspired by 'My Neighbor Totoro' and 'Spirited Away', with a gentle Japanese countryside atmosphere,"
-        selected_change = 0.65
-        selected_scale = 12
+    assistant_prompt, style_change, style_scale = core.style_settings(
+        drawing_style[1], selected_change, selected_scale
+    )
 
     if input_condition == "photo":
-        # Define Replicate API Client
-        replicate.client = replicate.Client(api_token=GPT_API_KEY2)
-
-        # Accept User's Prompt
+        # Accept User's Photo (or many, in batch mode)
+        batch_mode = st.toggle("Batch mode (many photos at once)")
         uploaded_file = st.file_uploader(
-            "Upload your photo.", type=["jpg", "png", "jpeg"]
+            "Upload your photos." if batch_mode else "Upload your photo.",
+            type=["jpg", "png", "jpeg"],
+            accept_multiple_files=batch_mode,
         )
 
-        # Accept User's Prompt (Optional)
-        user_prompt = st.text_input(
-            "Enter your prompt if necessary:",
-            placeholder=(
-                "[EN] A woman in a white astronaut suit with orange flowers, [KR] 눈 내리는 숲 속 파란 망토 소녀"
-            ),
+        preview = st.container()
+
+        # Accept User's Prompt (Optional) & Actions (a form: typing doesn't rerun)
+        with st.form("photo_actions", border=False):
+            user_prompt = st.text_input(
+                "Enter your prompt if necessary:",
+                placeholder=(
+                    "[EN] A woman in a white astronaut suit with orange flowers, [KR] 눈 내리는 숲 속 파란 망토 소녀"
+                ),
+            )
+
+            # Action to Cartoonize (batch, selected style, or every style side by side)
+            if batch_mode:
+                cartoonize_batch = st.form_submit_button(
+                    f"Cartoonize {len(uploaded_file or [])} Photos"
+                )
+            else:
+                action_one, action_all = st.columns(2)
+                cartoonize_one = action_one.form_submit_button("Cartoonize your Photo")
+                cartoonize_all = action_all.form_submit_button("Compare all Styles")
+
+        generation_input = core.build_generation_input(
+            drawing_style_name,
+            assistant_prompt,
+            user_prompt,
+            style_change,
+            style_scale,
+            selected_ratio.split(" | ")[1],
         )
 
-        if uploaded_file is not None:
+        if batch_mode:
+            if (
+                uploaded_file
+                and cartoonize_batch
+                and ui.admit_request(len(uploaded_file), "replicate")
+            ):
+
+                def cartoonize_upload(data):
+                    # Check File Size (Max 5MB)
+                    if len(data) > 5 * 1024 * 1024:
+                        raise ValueError("File size exceeds 5MB")
+                    prepared = preprocess.prepare_image(
+                        data, aspect_ratio=selected_ratio.split(" | ")[1]
+                    )
+                    return core.cartoonize_photo(config, prepared, generation_input)
+
+                ui.render_batch(
+                    [(f.name, f.getvalue()) for f in uploaded_file],
+                    cartoonize_upload,
+                    f"{drawing_style_name} style of cartoon",
+                    details=lambda name, data: {
+                        "input_hash": history.input_hash(data),
+                        "style": drawing_style[1],
+                        "provider": "replicate",
+                        "params": generation_input,
+                    },
+                )
+
+        elif uploaded_file is not None:
             # Check File Size (Max 5MB)
             if uploaded_file.size > 5 * 1024 * 1024:
                 st.warning("File size exceeds 5MB. Try again.")
             else:
-                # Load Original Image
-                image = Image.open(uploaded_file)
+                # Prepare Upload Image (memoized per upload & aspect ratio)
+                prepared = ui.prepare_upload(
+                    uploaded_file.getvalue(),
+                    aspect_ratio=selected_ratio.split(" | ")[1],
+                )
+
+                # Show Original Image (above the prompt form)
+                with preview:
+                    ui.show_prepared(prepared)
+                    ui.previous_results(uploaded_file.getvalue())
+                upload_hash = history.input_hash(uploaded_file.getvalue())
+
+                # Per-user Rate Limit (a burst of clicks is refused, not queued)
+                if (cartoonize_one or cartoonize_all) and not ui.admit_request(
+                    len(core.STYLE_PRESETS) if cartoonize_all else 1, "replicate"
+                ):
+                    cartoonize_one = cartoonize_all = False
+
+                if cartoonize_one and selected_provider.split(" | ")[1] == "auto":
+                    # Route to the Fastest Healthy Provider (hedged when it lags)
+                    request = router.CartoonRequest(
+                        prepared,
+                        drawing_style_name,  # same style name as the direct path
+                        user_prompt,
+                        selected_change,
+                        selected_scale,
+                        selected_ratio.split(" | ")[1],
+                    )
+                    try:
+                        started = time.monotonic()
+                        with st.spinner("Transforming..."):
+                            provider, cartoon = router.get_router(config).run(request)
+                        ui.keep_result(
+                            cartoon,
+                            f"{drawing_style_name} style of cartoon ({provider})",
+                            input_hash=upload_hash,
+                            style=drawing_style[1],
+                            provider=provider,
+                            params=generation_input,
+                            latency=time.monotonic() - started,
+                        )
+                    except RuntimeError as e:
+                        st.session_state.cartoon_error = str(e)
+
+                    with st.expander("Provider latency"):
+                        st.dataframe(router.get_router(config).snapshot())
+
+                elif cartoonize_one and selected_provider.split(" | ")[1] == "classic":
+                    # Cartoonize Locally (NumPy engine: no network, sub-second)
+                    started = time.monotonic()
+                    import classic  # numpy loads only when the local engine runs
+
+                    with st.spinner("Transforming..."), metrics.track(
+                        "transform", "classic"
+                    ):
+                        cartoon = classic.cartoonize_bytes(prepared.data)
+                    ui.keep_result(
+                        cartoon,
+                        "classic cartoon (local)",
+                        input_hash=upload_hash,
+                        style="classic",
+                        provider="classic",
+                        latency=time.monotonic() - started,
+                    )
+
+                elif cartoonize_one:
+                    # Look up Cached Result (same photo & parameters)
+                    result_cache = cache.get_result_cache()
+                    result_key = cache.cache_key(
+                        prepared.data,
+                        {"model": GPT_MODEL2, **generation_input},
+                    )
+                    cartoon = result_cache.get(result_key)
+
+                    if cartoon is None:
+                        # Upload Image on Cloudflare Storage
+                        image_url = None
+                        with st.spinner("Uploading..."):
+                            image_url = upload_image_to_storage(prepared)
+
+                        # if img_b64:
+                        if image_url:
+                            # Transform custom image & prompt into cartoon using multi models (non-blocking)
+                            ui.submit_prediction(
+                                jobs.create_client(GPT_API_KEY2, REPLICATE_API_URL),
+                                GPT_MODEL2,
+                                {"image": image_url, **generation_input},
+                                result_key,
+                                f"{drawing_style_name} style of cartoon",
+                                {
+                                    "input_hash": upload_hash,
+                                    "style": drawing_style[1],
+                                    "provider": "replicate",
+                                    "params": generation_input,
+                                },
+                            )
 
-                # Show Original Image
-                st.image(image, caption="Original Image", use_container_width=True)
+                    # Show Transformed Image (cache hit: no latency to record)
+                    if cartoon:
+                        ui.keep_result(
+                            cartoon,
+                            f"{drawing_style_name} style of cartoon",
+                            input_hash=upload_hash,
+                            style=drawing_style[1],
+                            provider="cache",
+                            params=generation_input,
+                        )
 
-                # Action to Cartoonize
-                if st.button("Cartoonize your Photo"):
-                    # Upload Image on Cloudflare Storage
+                if cartoonize_all:
+                    # Upload Image Once, then Fan out One Transform per Style
                     image_url = None
                     with st.spinner("Uploading..."):
-                        image_url = upload_image_to_storage(uploaded_file)
+                        image_url = upload_image_to_storage(prepared)
 
-                    # if img_b64:
                     if image_url:
-                        prompt_plus = f"""
-                            A cartoon version of the input image, maintaining the same pose, background and facial expression. 
-                            Clean lines, bright colors, {drawing_style_name} style, but with the original subject's identity preserved. 
-                            {assistant_prompt if len(assistant_prompt) > 0 else ""}
-                            {user_prompt if len(user_prompt) > 5 else ""}
-                        """
-                        prompt_minus = "disfigured, kitsch, ugly, oversaturated, greain, low-res, deformed, blurry, bad anatomy, poorly drawn face, mutation, mutated, extra limb, poorly drawn hands, missing limb, floating limbs, disconnected limbs, malformed hands, blur, out of focus, long neck, long body, disgusting, poorly drawn, childish, mutilated, mangled, old, surreal, calligraphy, sign, writing, watermark, text, body out of frame, extra legs, extra arms, extra feet, out of frame, poorly drawn feet, cross-eye"
-
-                        # Transform custom image & prompt into cartoon using multi models
-                        cartoon_url = None
-                        with st.spinner("Transforming..."):
-                            output = replicate.run(
-                                GPT_MODEL2,
-                                input={
-                                    "image": image_url,
-                                    "prompt": prompt_plus,
-                                    "negative_prompt": prompt_minus,
-                                    "prompt_strength": selected_change,
-                                    "strength": selected_change,
-                                    "guidance_scale": selected_scale,
-                                    "output_quality": 90,
-                                    "num_inference_steps": 30,
-                                    "num_outputs": 1,
-                                    "aspect_ratio": selected_ratio.split(" | ")[1],
-                                },
-                            )
-                            cartoon_url = (
-                                str(output[0])
-                                if isinstance(output, list)
-                                else str(output)
-                            )
+                        ui.render_batch(
+                            [
+                                (
+                                    style,
+                                    core.build_style_input(
+                                        style,
+                                        user_prompt,
+                                        selected_change,
+                                        selected_scale,
+                                        selected_ratio.split(" | ")[1],
+                                    ),
+                                )
+                                for style in core.STYLE_PRESETS
+                            ],
+                            lambda style_input: core.cartoonize_photo(
+                                config, prepared, style_input, image_url
+                            ),
+                            "style of cartoon",
+                            columns=2,
+                            details=lambda style, style_input: {
+                                "input_hash": upload_hash,
+                                "style": style,
+                                "provider": "replicate",
+                                "params": style_input,
+                            },
+                        )
 
-                        # Show Transformed Image
-                        if cartoon_url:
-                            st.image(
-                                cartoon_url,
-                                caption=f"{drawing_style_name} style of cartoon",
-                                use_container_width=True,
-                            )
+                # Track Running Prediction & Show Finished Result
+                ui.track_prediction()
+
+                # Kept in the session (as a result id) so reruns can re-show it
+                finished = st.session_state.get("cartoon")
+                if finished:
+                    with metrics.track("render", "streamlit"):
+                        ui.show_result(
+                            finished["id"],
+                            finished["caption"],
+                            lut.grade_for_style(drawing_style[1]),
+                        )
+                if "cartoon_error" in st.session_state:
+                    st.error(
+                        f"Failed to transform: {st.session_state.pop('cartoon_error')}"
+                    )
 
     else:
-        # Define OpenAI API Client
-        client = openai.OpenAI(api_key=GPT_API_KEY1)
-
         # Accept User's Prompt
         user_prompt = st.text_input("Enter your prompt (at least 10 characters):")
 
@@ -280,29 +451,62 @@ else:
 
         if user_prompt:
             if len(user_prompt) >= 10:
+                ui.previous_results(user_prompt)
+
                 # Action to Cartoonize
-                if st.button("Cartoonize your Prompt"):
-                    # Transform custom prompt into cartoon using dall-e-3
-                    cartoon_url = None
-                    with st.spinner("Transforming..."):
-                        response = client.images.generate(
-                            model=GPT_MODEL1,
-                            size=selected_ratio.split(" | ")[1],
-                            prompt=f"""
-                                {drawing_style_name} style of cartoon, 
-                                {assistant_prompt if len(assistant_prompt) > 0 else ""}
-                                {user_prompt}
-                            """,
-                            n=1,
-                        )
-                        cartoon_url = response.data[0].url
-
-                    if cartoon_url:
-                        # Show Transformed Image
-                        st.image(
-                            cartoon_url,
-                            caption=f"[{drawing_style[0]}] {user_prompt}",
-                            use_container_width=True,
+                if st.button("Cartoonize your Prompt") and ui.admit_request(
+                    provider="openai"
+                ):
+                    # Look up Cached Image (same normalized prompt, style & size)
+                    size = selected_ratio.split(" | ")[1]
+                    prompt_cache = cache.get_prompt_cache()
+                    prompt_key = core.text_cache_key(
+                        config, drawing_style_name, assistant_prompt, user_prompt, size
+                    )
+                    cartoon = prompt_cache.get(prompt_key)
+                    started = time.monotonic() if cartoon is None else None
+
+                    if cartoon is None:
+                        # Transform custom prompt into cartoon using dall-e-3
+                        with st.spinner("Transforming..."):
+                            cartoon = core.cartoonize_prompt(
+                                config,
+                                core.build_text_prompt(
+                                    drawing_style_name, assistant_prompt, user_prompt
+                                ),
+                                size,
+                            )
+                        prompt_cache.put(prompt_key, cartoon)
+
+                    ui.keep_result(
+                        cartoon,
+                        f"[{drawing_style[0]}] {user_prompt}",
+                        key="prompt_cartoon",
+                        input_hash=history.input_hash(user_prompt),
+                        style=drawing_style[1],
+                        provider="openai" if started else "cache",
+                        params={"size": size},
+                        latency=time.monotonic() - started if started else None,
+                    )
+
+                # Show Transformed Image
+                finished = st.session_state.get("prompt_cartoon")
+                if finished:
+                    with metrics.track("render", "streamlit"):
+                        ui.show_result(
+                            finished["id"],
+                            finished["caption"],
+                            lut.grade_for_style(drawing_style[1]),
                         )
+
+                    prompt_cache = cache.get_prompt_cache()
+                    st.caption(
+                        f"Prompt cache hit rate: {prompt_cache.hit_rate:.0%} "
+                        f"({prompt_cache.hits} / {prompt_cache.hits + prompt_cache.misses})"
+                    )
             else:
                 st.error("⚠️ Please enter at least 10 characters.")
+
+    # Past Results (per-user history: reopening one costs no new generation)
+    with st.expander("My history"):
+        ui.history_gallery()
@@ -1,8 +1,14 @@
-from dotenv import dotenv_values
-from PIL import Image
-from requests_toolbelt.multipart.encoder import MultipartEncoder
-import requests
+import cache
+import core
+import history
+import lut
+import metrics
+import preprocess
+import settings
+import storage
 import streamlit as st
+import time
+import ui
 
 
 # Streamlit App UI
@@ -18,11 +24,37 @@ if "CLOUDFLARE_ACCOUNT_ID" in st.secrets:
     IMAGE_ACCOUNT_ID = st.secrets["CLOUDFLARE_ACCOUNT_ID"]
     IMAGE_API_URL = st.secrets["CLOUDFLARE_API_URL"]
     IMAGE_API_KEY = st.secrets["CLOUDFLARE_API_TOKEN_IMAGES"]
+    METRICS_PORT = st.secrets.get("METRICS_PORT")
+    METRICS_LOG = st.secrets.get("METRICS_LOG")
 else:
-    config = dotenv_values(".env")
+    config = core.load_config()
     IMAGE_ACCOUNT_ID = config["CLOUDFLARE_ACCOUNT_ID"]
     IMAGE_API_URL = config["CLOUDFLARE_API_URL"]
     IMAGE_API_KEY = config["CLOUDFLARE_API_TOKEN_IMAGES"]
+    METRICS_PORT = config.get("METRICS_PORT")
+    METRICS_LOG = config.get("METRICS_LOG")
+
+# Metrics Exporter (/metrics on METRICS_PORT) & JSON Request Log
+metrics.setup(METRICS_PORT, METRICS_LOG)
+
+# Shared Generation Core (same worker call, cache key and slot as app.py)
+CORE_CONFIG = {
+    "CLOUDFLARE_ACCOUNT_ID": IMAGE_ACCOUNT_ID,
+    "CLOUDFLARE_API_URL": IMAGE_API_URL,
+    "CLOUDFLARE_API_TOKEN_IMAGES": IMAGE_API_KEY,
+}
+
+
+# Cartoon Styles ("label | style")
+STYLE_OPTIONS = (
+    "지브리 | ghibli",
+    "짱구   | crayon shinchan",
+    "디즈니 | disney",
+    "고흐   | van gogh",
+    "케이팝 | k-pop idol",
+    "뽀로로 | ppororo",
+    "셀럽 | celebrity",
+)
 
 
 # Handle OAuth Login
@@ -41,15 +73,7 @@ with st.sidebar:
     # Cartoon Style
     selected_style = st.selectbox(
         "Choose a Cartoon Style",
-        (
-            "지브리 | ghibli",
-            "짱구   | crayon shinchan",
-            "디즈니 | disney",
-            "고흐   | van gogh",
-            "케이팝 | k-pop idol",
-            "뽀로로 | ppororo",
-            "셀럽 | celebrity",
-        ),
+        STYLE_OPTIONS,
     )
 
     # Link to Github Repo
@@ -61,79 +85,126 @@ with st.sidebar:
     st.write(f"[![Repo]({badge_link})]({github_link})")
 
 
-def upload_image_to_storage(image_file):
-    encoder = MultipartEncoder(
-        fields={"file": (image_file.name, image_file, "image/jpeg")}
-    )
-    headers = {
-        "Authorization": f"Bearer {IMAGE_API_KEY}",
-        "Content-Type": encoder.content_type,
-    }
-
-    IMAGE_UPLOAD_URL = f"{IMAGE_API_URL}/{IMAGE_ACCOUNT_ID}/images/v1"
-    response = requests.post(IMAGE_UPLOAD_URL, headers=headers, data=encoder)
-
-    if response.status_code == 200:
-        return response.json()["result"]["variants"][0]
-    else:
-        st.error(f"Failed to upload: {response.text}")
-        return None
-
-
 if not IMAGE_API_KEY:
     st.error("Please input your Cloudflare API Token on runtime configuration")
 else:
-    uploaded_file = st.file_uploader("Upload your photo!", type=["jpg", "png", "jpeg"])
+    # Accept User's Photo (or many, in batch mode)
+    batch_mode = st.toggle("Batch mode (many photos at once)")
+    uploaded_file = st.file_uploader(
+        "Upload your photos!" if batch_mode else "Upload your photo!",
+        type=["jpg", "png", "jpeg"],
+        accept_multiple_files=batch_mode,
+    )
 
-    if uploaded_file is not None:
+    art_style = selected_style.split(" | ")[1]
+
+    if batch_mode:
+        if (
+            uploaded_file
+            and st.button(f"Cartoonize {len(uploaded_file)} Photos")
+            and ui.admit_request(len(uploaded_file), "cloudflare")
+        ):
+
+            def cartoonize_upload(data):
+                # Check File Size (Max 3MB)
+                if len(data) > 3 * 1024 * 1024:
+                    raise ValueError("File size exceeds 3MB")
+                prepared = preprocess.prepare_image(data)
+                return core.cartoonize_with_worker(
+                    prepared, art_style, upload_config=CORE_CONFIG
+                )
+
+            ui.render_batch(
+                [(f.name, f.getvalue()) for f in uploaded_file],
+                cartoonize_upload,
+                f"{art_style} style of cartoon",
+                details=lambda name, data: {
+                    "input_hash": history.input_hash(data),
+                    "style": art_style,
+                    "provider": "cloudflare-worker",
+                },
+            )
+
+    elif uploaded_file is not None:
         # Check File Size (Max 3MB)
         if uploaded_file.size > 3 * 1024 * 1024:
             st.warning("File size exceeds 3MB. Try again.")
         else:
-            # Load Original Image
-            image = Image.open(uploaded_file)
-
-            # Select Image Rataion
-            rotation = st.radio("Image Rotation", ("None", "Left 90", "Right 90"))
-            if rotation == "Left 90":
-                image = image.rotate(90, expand=True)
-            elif rotation == "Right 90":
-                image = image.rotate(-90, expand=True)
-
-            #  Show Original Image
-            st.image(image, caption="Original Image", use_container_width=True)
-
-            # Action to Cartoonize
-            if st.button("Cartoonize"):
-                # Upload Image on Cloudflare Storage
-                image_url = None
-                with st.spinner("Uploading..."):
-                    image_url = upload_image_to_storage(uploaded_file)
-
-                if image_url:
-                    st.success("✅ Uploaded!")
-
-                    # Transform Uploaded Image using Cloudflare Workers
-                    art_style = selected_style.split(" | ")[1]
-                    files = {"file": uploaded_file.getvalue(), "style": art_style}
-
-                    with st.spinner("Transforming..."):
-                        response = requests.post(
-                            "https://cartoonize.toweringcloud.workers.dev", files=files
-                        )
-
-                    if response.status_code == 200:
-                        result = response.json()
-                        cartoon_url = result.get("result", {}).get("variants", [])[0]
-
-                        if cartoon_url:
-                            st.success("✅ Transformed!")
-
-                            # Show Transformed Image
-                            st.image(
-                                cartoon_url,
-                                caption=f"{art_style} style of cartoon",
-                                use_container_width=True,
+            # Select Rotation & Show Original Image (memoized; rotating reruns only the preview)
+            ui.preview_upload(uploaded_file.getvalue())
+            prepared = st.session_state.prepared
+            ui.previous_results(uploaded_file.getvalue())
+            upload_hash = history.input_hash(uploaded_file.getvalue())
+
+            # Action to Cartoonize (selected style, or every style side by side)
+            action_one, action_all = st.columns(2)
+            cartoonize_all = action_all.button(
+                "Compare all Styles"
+            ) and ui.admit_request(len(STYLE_OPTIONS), "cloudflare")
+            if action_one.button("Cartoonize") and ui.admit_request(
+                provider="cloudflare"
+            ):
+                st.session_state.pop("cartoon", None)
+                # Look up Cached Result (same photo & style)
+                cartoon = cache.get_result_cache().get(
+                    core.worker_cache_key(prepared, art_style)
+                )
+                started = time.monotonic() if cartoon is None else None
+
+                if cartoon is None:
+                    # Upload Image on Cloudflare Storage, then Transform using Cloudflare Workers
+                    try:
+                        with st.spinner("Transforming..."):
+                            cartoon = core.cartoonize_with_worker(
+                                prepared, art_style, upload_config=CORE_CONFIG
                             )
-                        else:
-                            st.error("Failed to transform...😢")
+                    except storage.UploadError as e:
+                        st.error(f"Failed to upload: {e}")
+                    except Exception as e:
+                        st.error(f"Failed to transform...😢 ({e})")
+
+                if cartoon:
+                    ui.keep_result(
+                        cartoon,
+                        f"{art_style} style of cartoon",
+                        input_hash=upload_hash,
+                        style=art_style,
+                        provider="cloudflare-worker" if started else "cache",
+                        latency=time.monotonic() - started if started else None,
+                    )
+
+            if cartoonize_all:
+                # Fan out One Transform per Style (the worker takes the photo
+                # bytes itself, so there is nothing to upload first)
+                styles = [option.split(" | ")[1] for option in STYLE_OPTIONS]
+                ui.render_batch(
+                    [(style, style) for style in styles],
+                    lambda style: core.cartoonize_with_worker(prepared, style),
+                    "style of cartoon",
+                    columns=2,
+                    details=lambda style, _: {
+                        "input_hash": upload_hash,
+                        "style": style,
+                        "provider": "cloudflare-worker",
+                    },
+                )
+
+            # Show Transformed Image (kept in the session so reruns can re-show it)
+            finished = st.session_state.get("cartoon")
+            if finished:
+                st.success("✅ Transformed!")
+                ui.show_result(
+                    finished["id"],
+                    finished["caption"],
+                    lut.grade_for_style(selected_style.split(" | ")[1]),
+                )
+
+    # Past Results (per-user history: reopening one costs no new generation)
+    with st.expander("My history"):
+        ui.history_gallery()
+
+
+# Pre-connect to Cloudflare once the first page is out
+settings.warm_up(
+    ("requests_toolbelt.multipart.encoder",), urls=(IMAGE_API_URL, core.WORKER_URL)
+)
@@ -1,6 +1,11 @@
-from dotenv import dotenv_values
-import openai
+import cache
+import core
+import history
+import lut
+import metrics
 import streamlit as st
+import time
+import ui
 
 
 # Streamlit App UI
@@ -17,12 +22,19 @@ if "OPENAI_API_KEY" in st.secrets:
     LOGIN_PW = st.secrets["CUSTOM_LOGIN_PW"]
     API_KEY = st.secrets["OPENAI_API_KEY"]
     GPT_MODEL = st.secrets["OPENAI_MODEL_DRAW"]
+    METRICS_PORT = st.secrets.get("METRICS_PORT")
+    METRICS_LOG = st.secrets.get("METRICS_LOG")
 else:
-    config = dotenv_values(".env")
+    config = core.load_config()
     LOGIN_ID = config["CUSTOM_LOGIN_ID"]
     LOGIN_PW = config["CUSTOM_LOGIN_PW"]
     API_KEY = config["OPENAI_API_KEY"]
     GPT_MODEL = config["OPENAI_MODEL_DRAW"]
+    METRICS_PORT = config.get("METRICS_PORT")
+    METRICS_LOG = config.get("METRICS_LOG")
+
+# Metrics Exporter (/metrics on METRICS_PORT) & JSON Request Log
+metrics.setup(METRICS_PORT, METRICS_LOG)
 
 
 def login():
@@ -31,6 +43,8 @@ def login():
 
     if username == LOGIN_ID and password == LOGIN_PW:
         st.session_state.logged_in = True
+        # Widget keys are dropped once the login form is gone: keep the name
+        st.session_state.user_id = username
         st.success("✅ Welcome to Cartoonize GPT!")
     else:
         st.warning("Check your Account!")
@@ -85,36 +99,65 @@ with st.sidebar:
 if not API_KEY:
     st.error("Please setup your OpenAI API Key on the runtime configuration")
 else:
-    # Define OpenAI API Client
-    client = openai.OpenAI(api_key=API_KEY)
+    # OpenAI Settings for the Generation Core (memoized client, openai slot)
+    core_config = {"OPENAI_API_KEY": API_KEY, "OPENAI_MODEL_TTI": GPT_MODEL}
 
     # Accept User's Prompt
     user_prompt = st.text_input("Enter your prompt (at least 10 characters):")
 
     if user_prompt:
         if len(user_prompt) >= 10:
+            ui.previous_results(user_prompt)
+
             # Action to Cartoonize
-            if st.button("Cartoonize"):
-                # Transform Uploaded Image using OpenAI DALL·E API
-                cartoon_url = None
-                with st.spinner("Transforming..."):
-                    art_style = selected_style.split(" | ")
-                    response = client.images.generate(
-                        model=GPT_MODEL,
-                        prompt=f"{user_prompt}, {art_style[0]} 스타일로 보여줘~",
-                        size=selected_size.split(" | ")[1],
-                        n=1,
-                    )
-                    cartoon_url = response.data[0].url
-
-                if cartoon_url:
-                    st.success("✅ Transformed!")
-
-                    # Show Transformed Image
-                    st.image(
-                        cartoon_url,
-                        caption=f"[{art_style[0]}] {user_prompt}",
-                        use_container_width=True,
-                    )
+            if st.button("Cartoonize") and ui.admit_request(provider="openai"):
+                # Look up Cached Image (same normalized prompt, style & size)
+                art_style = selected_style.split(" | ")
+                prompt_cache = cache.get_prompt_cache()
+                prompt_key = cache.prompt_cache_key(
+                    GPT_MODEL, user_prompt, art_style[1], selected_size.split(" | ")[1]
+                )
+                cartoon = prompt_cache.get(prompt_key)
+                started = time.monotonic() if cartoon is None else None
+
+                if cartoon is None:
+                    # Transform Uploaded Image using OpenAI DALL·E API
+                    with st.spinner("Transforming..."):
+                        cartoon = core.cartoonize_prompt(
+                            core_config,
+                            f"{user_prompt}, {art_style[0]} 스타일로 보여줘~",
+                            selected_size.split(" | ")[1],
+                        )
+                    prompt_cache.put(prompt_key, cartoon)
+
+                ui.keep_result(
+                    cartoon,
+                    f"[{art_style[0]}] {user_prompt}",
+                    input_hash=history.input_hash(user_prompt),
+                    style=art_style[1],
+                    provider="openai" if started else "cache",
+                    params={"size": selected_size.split(" | ")[1]},
+                    latency=time.monotonic() - started if started else None,
+                )
+
+            # Show Transformed Image
+            finished = st.session_state.get("cartoon")
+            if finished:
+                st.success("✅ Transformed!")
+                ui.show_result(
+                    finished["id"],
+                    finished["caption"],
+                    lut.grade_for_style(selected_style.split(" | ")[1]),
+                )
+
+                prompt_cache = cache.get_prompt_cache()
+                st.caption(
+                    f"Prompt cache hit rate: {prompt_cache.hit_rate:.0%} "
+                    f"({prompt_cache.hits} / {prompt_cache.hits + prompt_cache.misses})"
+                )
         else:
             st.error("⚠️ Please enter at least 10 characters.")
+
+    # Past Results (per-user history: reopening one costs no new generation)
+    with st.expander("My history"):
+        ui.history_gallery()
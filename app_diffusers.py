@@ -1,9 +1,16 @@
-from diffusers import StableDiffusionControlNetPipeline, ControlNetModel
-from dotenv import dotenv_values
-from PIL import Image
-import openai
+import core
+import describe
+import diffusion
+import history
+import io
+import lut
+import metrics
+import scheduler
+import settings
 import streamlit as st
-import torch
+import tiling
+import time
+import ui
 
 
 # Streamlit App UI
@@ -19,11 +26,24 @@ if "OPENAI_API_KEY" in st.secrets:
     LANGUAGE = st.secrets["CUSTOM_LANGUAGE"]
     API_KEY = st.secrets["OPENAI_API_KEY"]
     GPT_MODEL = st.secrets["OPENAI_MODEL_DRAW"]
+    METRICS_PORT = st.secrets.get("METRICS_PORT")
+    METRICS_LOG = st.secrets.get("METRICS_LOG")
+    DIFFUSION_OPTIONS = diffusion.options_from_config(st.secrets)
+    DIFFUSION_THREADS = st.secrets.get("DIFFUSERS_THREADS")
+    DIFFUSION_LIMITS = scheduler.limits_from_config(st.secrets)
 else:
-    config = dotenv_values(".env")
+    config = core.load_config()
     LANGUAGE = config["CUSTOM_LANGUAGE"]
     API_KEY = config["OPENAI_API_KEY"]
     GPT_MODEL = config["OPENAI_MODEL_DRAW"]
+    METRICS_PORT = config.get("METRICS_PORT")
+    METRICS_LOG = config.get("METRICS_LOG")
+    DIFFUSION_OPTIONS = diffusion.options_from_config(config)
+    DIFFUSION_THREADS = config.get("DIFFUSERS_THREADS")
+    DIFFUSION_LIMITS = scheduler.limits_from_config(config)
+
+# Metrics Exporter (/metrics on METRICS_PORT) & JSON Request Log
+metrics.setup(METRICS_PORT, METRICS_LOG)
 
 
 with st.sidebar:
@@ -41,6 +61,12 @@ with st.sidebar:
         ),
     )
 
+    # Tiled Mode (overlapping 512px tiles: full resolution at bounded memory)
+    tiled = st.toggle(
+        "Full resolution (tiled)",
+        help=f"Process the photo in {tiling.TILE_SIZE}px tiles, up to {tiling.MAX_SIDE}px",
+    )
+
     # Link to Github Repo
     st.markdown("---")
     github_link = (
@@ -49,12 +75,26 @@ with st.sidebar:
     badge_link = "https://badgen.net/badge/icon/GitHub?icon=github&label"
     st.write(f"[![Repo]({badge_link})]({github_link})")
 
+    # Show Pipeline State (warm/cold)
+    status = diffusion.pipeline_status()
+    if status["state"] == "warm":
+        st.caption(
+            f"🔥 Pipeline warm on {status['device']} ({status['dtype']}, "
+            f"{status['scheduler'] or 'default'} scheduler), "
+            f"loaded in {status['load_seconds']:.1f}s"
+        )
+    else:
+        st.caption("🧊 Pipeline cold, loads in the background or on first run")
+    depth = scheduler.get_diffusion_scheduler(**DIFFUSION_LIMITS).depth
+    if depth:
+        st.caption(f"⏳ {depth} request(s) waiting for the next batch")
+
 
 if not API_KEY:
     st.error("Please input your Replicate API Token on runtime configuration")
 else:
-    # Define OpenAI API Client
-    client = openai.OpenAI(api_key=API_KEY)
+    # Define OpenAI API Client (process-wide, reused across reruns)
+    client = core.openai_client({"OPENAI_API_KEY": API_KEY})
 
     uploaded_file = st.file_uploader("Upload your photo.", type=["jpg", "png", "jpeg"])
 
@@ -63,59 +103,131 @@ else:
         if uploaded_file.size > 3 * 1024 * 1024:
             st.warning("File size exceeds 3MB. Try again.")
         else:
-            # Load Original Image
-            image = Image.open(uploaded_file)
+            # Select Rotation & Show Original Image (memoized; rotating reruns only the preview)
+            ui.preview_upload(uploaded_file.getvalue(), max_side=768, optimized=False)
+            image = st.session_state.prepared.image
+            ui.previous_results(uploaded_file.getvalue())
 
-            # Select Image Rataion
-            rotation = st.radio(
-                "Rotate your photo, if necessary.", ("None", "Left 90°", "Right 90°")
-            )
-            if rotation == "Left 90°":
-                image = image.rotate(90, expand=True)
-            elif rotation == "Right 90°":
-                image = image.rotate(-90, expand=True)
+            # Action to Cartoonize
+            cartoon_url = None
+            latency = None
+            running = "generation" in st.session_state
+            if st.button("Cartoonize", disabled=running) and ui.admit_request():
+                # Transform Uploaded Image using the local diffusers pipeline
+                pipeline_options = {
+                    k: v for k, v in DIFFUSION_OPTIONS.items() if k != "steps"
+                }
+                if diffusion.pipeline_status()["state"] == "cold":
+                    with st.spinner("Loading model..."):
+                        diffusion.set_threads(DIFFUSION_THREADS)
+                        diffusion.get_pipeline(**pipeline_options)
+
+                art_style = selected_style.split(" | ")[1]
+                prompt = f"high quality, {art_style} cartoon style"
+                if tiled:
+                    started = time.perf_counter()
+                    with st.spinner("Transforming..."), metrics.track(
+                        "transform", "diffusers"
+                    ):
+                        full = ui.prepare_full_upload(
+                            uploaded_file.getvalue(),
+                            rotation=ui.ROTATIONS[st.session_state.prepared_rotation],
+                            max_side=tiling.MAX_SIDE,
+                        )
+                        bar = st.progress(0.0, text="Tiles")
+                        cartoon_url = tiling.cartoonize_tiled(
+                            prompt,
+                            full.image,
+                            limits=DIFFUSION_LIMITS,
+                            progress=lambda done, total: bar.progress(
+                                done / total, text=f"Tiles {done}/{total}"
+                            ),
+                            **DIFFUSION_OPTIONS,
+                        )
+                    latency = time.perf_counter() - started
+                else:
+                    # Queue the run (batched with concurrent sessions) and follow
+                    # it across reruns, so Stop can end it and keep the result
+                    preview = diffusion.StepPreview()
+                    st.session_state.generation = {
+                        "future": scheduler.submit(
+                            prompt,
+                            image,
+                            limits=DIFFUSION_LIMITS,
+                            preview=preview,
+                            **DIFFUSION_OPTIONS,
+                        ),
+                        "preview": preview,
+                        "style": art_style,
+                        "started": metrics.begin("transform", "diffusers"),
+                    }
+
+            generation = st.session_state.get("generation")
+            if generation is not None:
+                art_style = generation["style"]
+                if st.button("Stop & keep current result"):
+                    generation["preview"].stop()
+
+                # Step previews every few steps (approximate colors, no VAE)
+                ui.follow_generation(generation["future"], generation["preview"])
+                del st.session_state.generation
+                error = generation["future"].exception()
+                metrics.end("transform", "diffusers", generation["started"], error)
+                if error is not None:
+                    st.error(f"Transformation failed: {error}")
+                else:
+                    cartoon_url = generation["future"].result()
+                    latency = time.perf_counter() - generation["started"]
+
+            if cartoon_url:
+                # Style Color Grade (precomputed 3D LUT, milliseconds)
+                cartoon_url = lut.apply(cartoon_url, lut.grade_for_style(art_style))
+
+                # Keep it in the user's history (the next rerun drops this image)
+                buffer = io.BytesIO()
+                cartoon_url.save(buffer, format="PNG")
+                ui.record_result(
+                    buffer.getvalue(),
+                    f"{art_style} style of cartoon",
+                    input_hash=history.input_hash(uploaded_file.getvalue()),
+                    style=art_style,
+                    provider="diffusers",
+                    params=DIFFUSION_OPTIONS,
+                    latency=latency,
+                )
+
+                # Describe the actual output in the background (vision model,
+                # downscaled copy); the image doesn't wait for it
+                description = describe.Description(
+                    client, GPT_MODEL, cartoon_url, LANGUAGE
+                )
+                st.success("✅ Transformed!")
+
+                # Show Transformed Image
+                st.image(
+                    cartoon_url,
+                    caption=f"{art_style} style of cartoon",
+                    use_container_width=True,
+                )
+
+                # Stream the Description as it arrives (instant when cached)
+                try:
+                    st.write_stream(description.stream())
+                    st.success("✅ Described!")
+                except Exception as e:
+                    st.warning(f"Description unavailable: {e}")
 
-            #  Show Original Image
-            st.image(image, caption="Original Image", use_container_width=True)
+    # Past Results (per-user history: reopening one costs no new generation)
+    with st.expander("My history"):
+        ui.history_gallery()
 
-            # Action to Cartoonize
-            if st.button("Cartoonize"):
-                # Transform Uploaded Image using OpenAI DALL·E API
-                cartoon_url = None
-                with st.spinner("Transforming..."):
-                    # Load ControlNet Model
-                    controlnet = ControlNetModel.from_pretrained(
-                        "lllyasviel/control_v11f1e_sd15_tile"
-                    )
-
-                    # Setup Stable Diffusion Pipeline
-                    pipe = StableDiffusionControlNetPipeline.from_pretrained(
-                        "runwayml/stable-diffusion-v1-5",
-                        controlnet=controlnet,
-                        torch_dtype=torch.float16,
-                    ).to("cuda")
-
-                    # Run Transformation with Prompt
-                    art_style = selected_style.split(" | ")[1]
-                    prompt = (f"high quality, {art_style} cartoon style",)
-                    cartoon_url = pipe(prompt=prompt, image=image).images[0]
-
-                if cartoon_url:
-                    st.success("✅ Transformed!")
-
-                    # Show Transformed Image
-                    st.image(
-                        cartoon_url,
-                        caption=f"{art_style} style of cartoon",
-                        use_container_width=True,
-                    )
-
-                    # Generate Summary on Image using LangChain
-                    description_prompt = f"Describe this cartoon-style image ({cartoon_url}) briefly in {LANGUAGE}.)"
-                    description = client.chat.completions.create(
-                        model=GPT_MODEL,
-                        messages=[{"role": "system", "content": description_prompt}],
-                    )
 
-                    st.success("✅ Described!")
-                    st.write(description.choices[0].message.content)
+# Warm up torch/diffusers & the pipeline once the first page is out
+def preload_pipeline():
+    diffusion.set_threads(DIFFUSION_THREADS)
+    diffusion.get_pipeline(
+        **{k: v for k, v in DIFFUSION_OPTIONS.items() if k != "steps"}
+    )
+
+
+settings.warm_up(("openai", "torch", "diffusers"), tasks=(preload_pipeline,))
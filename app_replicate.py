@@ -1,9 +1,14 @@
-from dotenv import dotenv_values
-from PIL import Image
-from requests_toolbelt.multipart.encoder import MultipartEncoder
-import replicate
-import requests
+import cache
+import core
+import history
+import jobs
+import lut
+import metrics
+import preprocess
+import settings
+import storage
 import streamlit as st
+import ui
 
 
 # Streamlit App UI
@@ -21,28 +26,51 @@ if "REPLICATE_API_TOKEN" in st.secrets:
     IMAGE_API_KEY = st.secrets["CLOUDFLARE_API_TOKEN_IMAGES"]
     GPT_API_KEY = st.secrets["REPLICATE_API_TOKEN"]
     GPT_MODEL = st.secrets["REPLICATE_MODEL_DRAW"]
+    REPLICATE_API_URL = st.secrets.get("REPLICATE_API_URL")
+    METRICS_PORT = st.secrets.get("METRICS_PORT")
+    METRICS_LOG = st.secrets.get("METRICS_LOG")
 else:
-    config = dotenv_values(".env")
+    config = core.load_config()
     IMAGE_ACCOUNT_ID = config["CLOUDFLARE_ACCOUNT_ID"]
     IMAGE_API_URL = config["CLOUDFLARE_API_URL"]
     IMAGE_API_KEY = config["CLOUDFLARE_API_TOKEN_IMAGES"]
     GPT_API_KEY = config["REPLICATE_API_TOKEN"]
     GPT_MODEL = config["REPLICATE_MODEL_DRAW"]
+    REPLICATE_API_URL = config.get("REPLICATE_API_URL")
+    METRICS_PORT = config.get("METRICS_PORT")
+    METRICS_LOG = config.get("METRICS_LOG")
+
+# Metrics Exporter (/metrics on METRICS_PORT) & JSON Request Log
+metrics.setup(METRICS_PORT, METRICS_LOG)
+
+# Shared Generation Core (same upload/slot/cache path as app.py)
+CORE_CONFIG = {
+    "CLOUDFLARE_ACCOUNT_ID": IMAGE_ACCOUNT_ID,
+    "CLOUDFLARE_API_URL": IMAGE_API_URL,
+    "CLOUDFLARE_API_TOKEN_IMAGES": IMAGE_API_KEY,
+    "REPLICATE_API_TOKEN": GPT_API_KEY,
+    "REPLICATE_MODEL_ITI": GPT_MODEL,
+    "REPLICATE_API_URL": REPLICATE_API_URL,
+}
+
+
+# Cartoon Styles ("label | style")
+STYLE_OPTIONS = (
+    "지브리 | ghibli",
+    "짱구   | crayon shinchan",
+    "디즈니 | disney",
+    "고흐   | van gogh",
+    "케이팝 | k-pop idol",
+    "뽀로로 | ppororo",
+    "셀럽 | celebrity",
+)
 
 
 with st.sidebar:
     # Cartoon Style
     selected_style = st.selectbox(
         "Choose a Cartoon Style",
-        (
-            "지브리 | ghibli",
-            "짱구   | crayon shinchan",
-            "디즈니 | disney",
-            "고흐   | van gogh",
-            "케이팝 | k-pop idol",
-            "뽀로로 | ppororo",
-            "셀럽 | celebrity",
-        ),
+        STYLE_OPTIONS,
     )
 
     # Link to Github Repo
@@ -54,23 +82,24 @@ with st.sidebar:
     st.write(f"[![Repo]({badge_link})]({github_link})")
 
 
-def upload_image_to_storage(image_file):
-    encoder = MultipartEncoder(
-        fields={"file": (image_file.name, image_file, "image/jpeg")}
-    )
-    headers = {
-        "Authorization": f"Bearer {IMAGE_API_KEY}",
-        "Content-Type": encoder.content_type,
-    }
+def upload_image_to_storage(prepared):
+    # Same Cloudflare slot & upload index as the worker/batch paths (core)
+    try:
+        return core.upload_image(CORE_CONFIG, prepared)
+    except storage.UploadError as e:
+        st.error(f"Failed to upload: {e}")
+        return None
 
-    IMAGE_UPLOAD_URL = f"{IMAGE_API_URL}/{IMAGE_ACCOUNT_ID}/images/v1"
-    response = requests.post(IMAGE_UPLOAD_URL, headers=headers, data=encoder)
 
-    if response.status_code == 200:
-        return response.json()["result"]["variants"][0]
-    else:
-        st.error(f"Failed to upload: {response.text}")
-        return None
+def build_generation_input(art_style):
+    return {
+        "prompt": f"A cartoon version of this image, high quality, digital art, {art_style} style",
+        "prompt_strength": 0.8,
+        "guidance_scale": 7.5,
+        "num_inference_steps": 25,
+        "num_outputs": 1,
+        "output_quality": 90,
+    }
 
 
 if not IMAGE_API_KEY:
@@ -78,64 +107,154 @@ if not IMAGE_API_KEY:
 elif not GPT_API_KEY:
     st.error("Please input your Replicate API Token on runtime configuration")
 else:
-    uploaded_file = st.file_uploader("Upload your photo.", type=["jpg", "png", "jpeg"])
+    # Accept User's Photo (or many, in batch mode)
+    batch_mode = st.toggle("Batch mode (many photos at once)")
+    uploaded_file = st.file_uploader(
+        "Upload your photos." if batch_mode else "Upload your photo.",
+        type=["jpg", "png", "jpeg"],
+        accept_multiple_files=batch_mode,
+    )
+
+    art_style = selected_style.split(" | ")[1]
+    generation_input = build_generation_input(art_style)
+
+    if batch_mode:
+        if (
+            uploaded_file
+            and st.button(f"Cartoonize {len(uploaded_file)} Photos")
+            and ui.admit_request(len(uploaded_file), "replicate")
+        ):
+
+            def cartoonize_upload(data):
+                # Check File Size (Max 3MB)
+                if len(data) > 3 * 1024 * 1024:
+                    raise ValueError("File size exceeds 3MB")
+                prepared = preprocess.prepare_image(data, max_side=1024)
+                return core.cartoonize_photo(CORE_CONFIG, prepared, generation_input)
+
+            ui.render_batch(
+                [(f.name, f.getvalue()) for f in uploaded_file],
+                cartoonize_upload,
+                f"{art_style} style of cartoon",
+                details=lambda name, data: {
+                    "input_hash": history.input_hash(data),
+                    "style": art_style,
+                    "provider": "replicate",
+                    "params": generation_input,
+                },
+            )
 
-    if uploaded_file is not None:
+    elif uploaded_file is not None:
         # Check File Size (Max 3MB)
         if uploaded_file.size > 3 * 1024 * 1024:
             st.warning("File size exceeds 3MB. Try again.")
         else:
-            # Load Original Image
-            image = Image.open(uploaded_file)
+            # Select Rotation & Show Original Image (memoized; rotating reruns only the preview)
+            ui.preview_upload(uploaded_file.getvalue(), max_side=1024)
+            prepared = st.session_state.prepared
+            ui.previous_results(uploaded_file.getvalue())
+            upload_hash = history.input_hash(uploaded_file.getvalue())
 
-            # Select Image Rataion
-            rotation = st.radio(
-                "Rotate your photo, if necessary.", ("None", "Left 90°", "Right 90°")
-            )
-            if rotation == "Left 90°":
-                image = image.rotate(90, expand=True)
-            elif rotation == "Right 90°":
-                image = image.rotate(-90, expand=True)
+            # Action to Cartoonize (selected style, or every style side by side)
+            action_one, action_all = st.columns(2)
+            cartoonize_all = action_all.button(
+                "Compare all Styles"
+            ) and ui.admit_request(len(STYLE_OPTIONS), "replicate")
+            if action_one.button("Cartoonize") and ui.admit_request(
+                provider="replicate"
+            ):
+                # Look up Cached Result (same photo & parameters)
+                result_cache = cache.get_result_cache()
+                result_key = cache.cache_key(
+                    prepared.data,
+                    {"model": GPT_MODEL, **generation_input},
+                )
+                cartoon = result_cache.get(result_key)
 
-            # Show Original Image
-            st.image(image, caption="Original Image", use_container_width=True)
+                if cartoon is None:
+                    # Upload Image on Cloudflare Storage
+                    image_url = None
+                    with st.spinner("Uploading..."):
+                        image_url = upload_image_to_storage(prepared)
 
-            # Action to Cartoonize
-            if st.button("Cartoonize"):
-                # Upload Image on Cloudflare Storage
-                image_url = None
-                with st.spinner("Uploading..."):
-                    image_url = upload_image_to_storage(uploaded_file)
+                    # if img_b64:
+                    if image_url:
+                        st.success("✅ Uploaded!")
 
-                # if img_b64:
-                if image_url:
-                    st.success("✅ Uploaded!")
-
-                    # Transform Uploaded Image using Replicate API (Stable Diffusion img2img)
-                    cartoon_url = None
-                    with st.spinner("Transforming..."):
-                        art_style = selected_style.split(" | ")[1]
-                        replicate.client = replicate.Client(api_token=GPT_API_KEY)
-                        output = replicate.run(
+                        # Transform Uploaded Image using Replicate API (Stable Diffusion img2img, non-blocking)
+                        ui.submit_prediction(
+                            jobs.create_client(GPT_API_KEY, REPLICATE_API_URL),
                             GPT_MODEL,
-                            input={
-                                "image": image_url,
-                                "prompt": f"A cartoon version of this image, high quality, digital art, {art_style} style",
-                                "prompt_strength": 0.8,
-                                "guidance_scale": 7.5,
-                                "num_inference_steps": 25,
-                                "num_outputs": 1,
-                                "output_quality": 90,
+                            {"image": image_url, **generation_input},
+                            result_key,
+                            f"{art_style} style of cartoon",
+                            {
+                                "input_hash": upload_hash,
+                                "style": art_style,
+                                "provider": "replicate",
+                                "params": generation_input,
                             },
                         )
-                        cartoon_url = output[0].url
 
-                    if cartoon_url:
-                        st.success("✅ Transformed!")
+                # Cache hit: no latency to record
+                if cartoon:
+                    ui.keep_result(
+                        cartoon,
+                        f"{art_style} style of cartoon",
+                        input_hash=upload_hash,
+                        style=art_style,
+                        provider="cache",
+                        params=generation_input,
+                    )
 
-                        # Show Transformed Image
-                        st.image(
-                            cartoon_url,
-                            caption=f"{art_style} style of cartoon",
-                            use_container_width=True,
-                        )
+            if cartoonize_all:
+                # Upload Image Once, then Fan out One Transform per Style
+                image_url = None
+                with st.spinner("Uploading..."):
+                    image_url = upload_image_to_storage(prepared)
+
+                if image_url:
+                    styles = [option.split(" | ")[1] for option in STYLE_OPTIONS]
+                    ui.render_batch(
+                        [(style, build_generation_input(style)) for style in styles],
+                        lambda style_input: core.cartoonize_photo(
+                            CORE_CONFIG, prepared, style_input, image_url
+                        ),
+                        "style of cartoon",
+                        columns=2,
+                        details=lambda style, style_input: {
+                            "input_hash": upload_hash,
+                            "style": style,
+                            "provider": "replicate",
+                            "params": style_input,
+                        },
+                    )
+
+            # Track Running Prediction & Show Finished Result
+            ui.track_prediction()
+
+            # Kept in the session (as a result id) so reruns can re-show it
+            finished = st.session_state.get("cartoon")
+            if finished:
+                st.success("✅ Transformed!")
+                ui.show_result(
+                    finished["id"],
+                    finished["caption"],
+                    lut.grade_for_style(selected_style.split(" | ")[1]),
+                )
+            if "cartoon_error" in st.session_state:
+                st.error(
+                    f"Failed to transform: {st.session_state.pop('cartoon_error')}"
+                )
+
+    # Past Results (per-user history: reopening one costs no new generation)
+    with st.expander("My history"):
+        ui.history_gallery()
+
+
+# Warm up the Replicate SDK & Cloudflare connection once the first page is out
+settings.warm_up(
+    ("replicate", "requests_toolbelt.multipart.encoder"),
+    urls=(IMAGE_API_URL,),
+    tasks=(lambda: jobs.create_client(GPT_API_KEY, REPLICATE_API_URL),),
+)
@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+import admission
+import io
+import time
+import zipfile
+
+
+MAX_WORKERS = 8
+
+# Per-provider Concurrency Caps (process-wide, enforced by admission control)
+PROVIDER_LIMITS = admission.PROVIDER_LIMITS
+
+
+def provider_slot(provider, cancel_event=None):
+    # Usage: with batch.provider_slot("replicate"): ... (FIFO across sessions)
+    return admission.get_controller().slot(provider, cancel_event=cancel_event)
+
+
+@dataclass
+class BatchResult:
+    index: int
+    name: str
+    data: bytes = None
+    error: str = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None and self.data is not None
+
+
+def _run_one(task, index, name, payload):
+    started = time.perf_counter()
+    try:
+        data = task(payload)
+        error = None
+    except Exception as e:
+        data, error = None, str(e) or type(e).__name__
+    return BatchResult(index, name, data, error, time.perf_counter() - started)
+
+
+def run_batch(items, task, max_workers=MAX_WORKERS):
+    # items: [(name, payload), ...] -> yields BatchResult in completion order
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch")
+    try:
+        futures = [
+            pool.submit(_run_one, task, index, name, payload)
+            for index, (name, payload) in enumerate(items)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # A rerun/abort stops iteration: drop queued items, don't wait for them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def guess_extension(data):
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "jpg"
+
+
+def build_zip(results):
+    buffer = io.BytesIO()
+    # Images are already compressed, so store them as-is
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        used = set()
+        for result in results:
+            if not result.ok:
+                continue
+            stem = result.name.rsplit(".", 1)[0]
+            extension = guess_extension(result.data)
+            filename = f"{stem}_cartoon.{extension}"
+            suffix = 1
+            while filename in used:
+                suffix += 1
+                filename = f"{stem}_cartoon_{suffix}.{extension}"
+            used.add(filename)
+            archive.writestr(filename, result.data)
+    return buffer.getvalue()
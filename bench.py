@@ -0,0 +1,279 @@
+from PIL import Image
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import batch
+import cache
+import classic
+import core
+import mock_servers
+import preprocess
+
+
+def sample_photo(seed=0, size=(3000, 2000)):
+    # Camera-sized JPEG with an EXIF rotation, so decode/transpose do real work
+    image = Image.effect_noise(size, 32 + seed % 64).convert("RGB")
+    image.putpixel((0, 0), (seed % 256, seed // 256 % 256, 0))  # unique bytes
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90° CW
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def summarize(samples, wall=None):
+    samples = sorted(samples)
+
+    def percentile(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    wall = wall if wall is not None else sum(samples)
+    return {
+        "iterations": len(samples),
+        "mean": sum(samples) / len(samples),
+        "min": samples[0],
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": samples[-1],
+        "throughput": len(samples) / wall if wall else None,  # ops/s
+    }
+
+
+def measure(task, payloads, warmup=1):
+    for payload in payloads[:warmup]:
+        task(payload)
+
+    samples = []
+    for payload in payloads[warmup:]:
+        started = time.perf_counter()
+        task(payload)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def measure_concurrent(task, payloads, concurrency):
+    started = time.perf_counter()
+    samples = []
+    for result in batch.run_batch(
+        [(str(i), payload) for i, payload in enumerate(payloads)],
+        task,
+        max_workers=concurrency,
+    ):
+        if not result.ok:
+            raise RuntimeError(result.error)
+        samples.append(result.seconds)
+    return summarize(samples, wall=time.perf_counter() - started)
+
+
+def bench_local(args):
+    photo = sample_photo()
+    prepared = preprocess.prepare_image(photo)
+    repeat = [None] * (args.iterations + 1)
+
+    def open_rotate(_):
+        # The original app path: full decode, then rotate
+        image = Image.open(io.BytesIO(photo))
+        image.transpose(Image.Transpose.ROTATE_90).load()
+
+    def multipart_encode(_):
+        MultipartEncoder(
+            fields={
+                "file": (
+                    prepared.filename,
+                    io.BytesIO(prepared.data),
+                    prepared.mime_type,
+                )
+            }
+        ).to_string()
+
+    def build_prompts(_):
+        for style in core.STYLE_PRESETS:
+            core.build_style_input(style, "a girl in a blue cape", 0.75, 10, "1:1")
+            assistant_prompt, _, _ = core.style_settings(style, 0.75, 10)
+            core.build_text_prompt(style, assistant_prompt, "a girl in a blue cape")
+
+    def megapixels_per_second(stats, image):
+        stats["megapixels_per_second"] = (
+            image.width * image.height / 1e6 * stats["throughput"]
+        )
+        return stats
+
+    # Classic engine: a preview-size upload and a full camera frame
+    full = Image.open(io.BytesIO(photo)).convert("RGB")
+    classic_preview = megapixels_per_second(
+        measure(lambda _: classic.cartoonize(prepared.image), repeat), prepared.image
+    )
+    classic_full = megapixels_per_second(
+        measure(
+            lambda _: classic.cartoonize(full), [None] * (min(args.iterations, 5) + 1)
+        ),
+        full,
+    )
+
+    return {
+        "classic_preview": classic_preview,
+        "classic_full": classic_full,
+        "image_open_rotate": measure(open_rotate, repeat),
+        "prepare_image": measure(
+            lambda _: preprocess.prepare_image(photo, rotation=90), repeat
+        ),
+        "multipart_encode": measure(multipart_encode, repeat),
+        "build_prompts": measure(build_prompts, repeat * 10),
+        "cache_key": measure(
+            lambda _: cache.cache_key(prepared.data, {"model": "m", "style": "s"}),
+            repeat * 10,
+        ),
+    }
+
+
+def bench_end_to_end(args, config):
+    # Distinct photos per request, so neither the upload index nor the
+    # result cache turns a request into a hit
+    count = args.iterations + 1
+    photos = [sample_photo(seed, size=(1600, 1200)) for seed in range(count * 3)]
+    generation_input = core.build_style_input("Pixar Disney", "", 0.75, 10, "1:1")
+
+    def upload(photo):
+        return core.upload_image(config, preprocess.prepare_image(photo))
+
+    def cartoonize_photo(photo):
+        return core.cartoonize_photo(
+            config, preprocess.prepare_image(photo), generation_input
+        )
+
+    def cartoonize_prompt(seed):
+        style = "Studio Ghibli"
+        assistant_prompt, _, _ = core.style_settings(style, 0.75, 10)
+        prompt = core.build_text_prompt(style, assistant_prompt, f"a cat #{seed}")
+        return core.cartoonize_prompt(config, prompt, "1024x1024")
+
+    return {
+        "e2e_upload": measure(upload, photos[:count]),
+        "e2e_photo": measure(cartoonize_photo, photos[count : count * 2]),
+        "e2e_photo_concurrent": measure_concurrent(
+            cartoonize_photo, photos[count * 2 :], args.concurrency
+        ),
+        "e2e_prompt": measure(cartoonize_prompt, list(range(count))),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(baseline, report, tolerance):
+    # Regression: p99 up or throughput down by more than the tolerance
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+
+        p99_change = current["p99"] / previous["p99"] - 1 if previous["p99"] else 0.0
+        throughput_change = (
+            current["throughput"] / previous["throughput"] - 1
+            if previous["throughput"]
+            else 0.0
+        )
+        flag = ""
+        if p99_change > tolerance or throughput_change < -tolerance:
+            regressions.append(name)
+            flag = "  << regression"
+        print(
+            f"{name:24} p99 {p99_change:+7.1%}  throughput {throughput_change:+7.1%}{flag}",
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark preprocessing, encoding, prompts and end-to-end "
+        "requests against local mock providers."
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("-j", "--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--latency",
+        default="",
+        help="mock provider seconds, e.g. replicate=2,openai=0.3,cloudflare=0.05",
+    )
+    parser.add_argument(
+        "--skip-e2e", action="store_true", help="only run the local micro benchmarks"
+    )
+    parser.add_argument("-o", "--output", default="bench.json", help="JSON report")
+    parser.add_argument("--compare", help="baseline JSON report from another commit")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed relative regression"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    latency = mock_servers.parse_latency(args.latency)
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "latency": latency,
+        "results": {},
+    }
+
+    # Run in a scratch directory: the .cache/ tiers start cold and stay out of the tree
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="cartoonize-bench-") as scratch:
+        os.chdir(scratch)
+        try:
+            report["results"].update(bench_local(args))
+            if not args.skip_e2e:
+                with mock_servers.MockProviders(latency) as providers:
+                    report["results"].update(bench_end_to_end(args, providers.config()))
+        finally:
+            os.chdir(cwd)
+
+    for name, stats in report["results"].items():
+        rate = stats.get("megapixels_per_second")
+        print(
+            f"{name:24} p50 {stats['p50'] * 1000:9.2f} ms  p99 {stats['p99'] * 1000:9.2f} ms"
+            f"  {stats['throughput']:9.1f} ops/s"
+            + (f"  {rate:6.1f} MP/s" if rate else ""),
+            file=sys.stderr,
+        )
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}", file=sys.stderr)
+
+    if baseline is not None and compare(baseline, report, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
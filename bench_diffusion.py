@@ -0,0 +1,101 @@
+from PIL import Image
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import diffusion
+
+
+PROMPT = "high quality, ghibli cartoon style"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report seconds per image for local diffusers configurations."
+    )
+    parser.add_argument("--device", default=None, help="cpu or cuda (default: auto)")
+    parser.add_argument("--dtype", nargs="+", default=["fp32", "bf16"])
+    parser.add_argument(
+        "--scheduler", nargs="+", default=["default", diffusion.CPU_SCHEDULER]
+    )
+    parser.add_argument("--steps", nargs="+", type=int, default=[diffusion.CPU_STEPS])
+    parser.add_argument(
+        "--compile", action="store_true", help="also measure torch.compile variants"
+    )
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--size", type=int, default=512, help="input image side")
+    parser.add_argument("-n", "--images", type=int, default=3, help="timed images")
+    parser.add_argument("-o", "--output", default="bench_diffusion.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    diffusion.set_threads(args.threads)
+    image = Image.effect_noise((args.size, args.size), 64).convert("RGB")
+
+    rows = []
+    for dtype, scheduler, steps, compile in itertools.product(
+        args.dtype,
+        args.scheduler,
+        args.steps,
+        (False, True) if args.compile else (False,),
+    ):
+        options = {
+            "device": args.device,
+            "dtype": dtype,
+            "scheduler": scheduler,
+            "compile": compile,
+        }
+
+        started = time.perf_counter()
+        diffusion.get_pipeline(**options)
+        load_seconds = time.perf_counter() - started
+
+        # Warm-up image (allocator, oneDNN primitives, compile) is not timed
+        diffusion.generate(PROMPT, image, steps=steps, **options)
+
+        started = time.perf_counter()
+        for _ in range(args.images):
+            diffusion.generate(PROMPT, image, steps=steps, **options)
+        seconds = (time.perf_counter() - started) / args.images
+
+        row = {
+            "dtype": dtype,
+            "scheduler": scheduler,
+            "steps": steps,
+            "compile": compile,
+            "load_seconds": round(load_seconds, 2),
+            "seconds_per_image": round(seconds, 2),
+        }
+        rows.append(row)
+        print(
+            f"{dtype:5} {scheduler:8} {steps:3} steps compile={compile!s:5} "
+            f"{seconds:7.2f} s/image",
+            file=sys.stderr,
+        )
+
+        # One pipeline resident at a time: CPU nodes can't hold several
+        diffusion._registry.clear()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "device": args.device or "auto",
+                "threads": args.threads,
+                "size": args.size,
+                "results": rows,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Saved {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
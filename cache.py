@@ -0,0 +1,271 @@
+from collections import OrderedDict
+from urllib.parse import urlparse
+import hashlib
+import http_client
+import json
+import metrics
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+
+
+CACHE_DIR = os.path.join(".cache", "results")
+PROMPT_CACHE_DIR = os.path.join(".cache", "prompts")
+DESCRIPTION_CACHE_DIR = os.path.join(".cache", "descriptions")
+TRAILING_PUNCTUATION = ".,!?~…。！？～ "
+
+
+def cache_key(image_bytes, params):
+    # Content Address: image bytes + every generation parameter (order-free)
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image_bytes).digest())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def normalize_prompt(text):
+    # NFC (composed Hangul), single spaces, case and trailing punctuation ignored
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split()).casefold().rstrip(TRAILING_PUNCTUATION)
+
+
+def prompt_cache_key(model, prompt, style, size, **params):
+    # Text-to-image Address: same normalized prompt, style & size -> same image
+    canonical = {
+        "model": model,
+        "prompt": normalize_prompt(prompt),
+        "style": normalize_prompt(style),
+        "size": "".join((size or "").split()).lower().replace("×", "x"),
+        **params,
+    }
+    return hashlib.sha256(
+        json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def read_result(output):
+    # Materialize a provider output (FileOutput, URL or list of them) into bytes
+    if isinstance(output, (list, tuple)):
+        output = output[0]
+    if hasattr(output, "read"):
+        with metrics.track("fetch", "replicate"):
+            return output.read()
+
+    url = str(output)
+    with metrics.track("fetch", urlparse(url).hostname or "unknown"):
+        response = http_client.get(url)
+        response.raise_for_status()
+        return response.content
+
+
+class MemoryLRU:
+    def __init__(self, max_items=64, max_bytes=256 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+
+            self._items[key] = value
+            self.total_bytes += len(value)
+
+            while (
+                len(self._items) > self.max_items or self.total_bytes > self.max_bytes
+            ):
+                _, evicted = self._items.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DiskCache:
+    def __init__(
+        self,
+        directory=CACHE_DIR,
+        max_bytes=1024 * 1024 * 1024,
+        ttl=7 * 86400,
+        max_items=None,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        # Expire by TTL (mtime = time of write)
+        if self.ttl and time.time() - stat.st_mtime > self.ttl:
+            self._remove(path)
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+
+        # Touch atime so eviction approximates LRU on filesystems with noatime
+        os.utime(path, (time.time(), stat.st_mtime))
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+
+        # Atomic write: readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            now = time.time()
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                if self.ttl and now - stat.st_mtime > self.ttl:
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            # Drop least recently used files until under the size/count budget
+            entries.sort()
+            count = len(entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes and (
+                    self.max_items is None or count <= self.max_items
+                ):
+                    break
+                self._remove(path)
+                total -= size
+                count -= 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ResultCache:
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else MemoryLRU()
+        self.disk = disk if disk is not None else DiskCache()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                # Promote disk hit into the memory tier
+                self.memory.put(key, value)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        self.disk.put(key, value)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# Process-wide Result Cache (shared by every Streamlit session & rerun)
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _result_cache
+
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
+
+
+# Process-wide Text-to-image Cache (normalized prompt -> image bytes)
+_prompt_cache = None
+_prompt_cache_lock = threading.Lock()
+
+
+def get_prompt_cache():
+    global _prompt_cache
+
+    if _prompt_cache is None:
+        with _prompt_cache_lock:
+            if _prompt_cache is None:
+                _prompt_cache = ResultCache(
+                    MemoryLRU(max_items=32, max_bytes=128 * 1024 * 1024),
+                    DiskCache(
+                        PROMPT_CACHE_DIR, max_bytes=512 * 1024 * 1024, max_items=2000
+                    ),
+                )
+    return _prompt_cache
+
+
+# Process-wide Description Cache (image content + model + language -> text)
+_description_cache = None
+_description_cache_lock = threading.Lock()
+
+
+def get_description_cache():
+    global _description_cache
+
+    if _description_cache is None:
+        with _description_cache_lock:
+            if _description_cache is None:
+                _description_cache = ResultCache(
+                    MemoryLRU(max_items=256, max_bytes=4 * 1024 * 1024),
+                    DiskCache(
+                        DESCRIPTION_CACHE_DIR,
+                        max_bytes=64 * 1024 * 1024,
+                        max_items=10000,
+                    ),
+                )
+    return _description_cache
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(ROOT, "importtime_baseline.json")
+
+# Modules on the cold-start path (app scripts run Streamlit on import, so
+# their own imports are covered through the modules they share)
+MODULES = (
+    "core",
+    "router",
+    "results",
+    "settings",
+    "metrics",
+    "diffusion",
+    "scheduler",
+    "tiling",
+    "describe",
+    "lut",
+    "admission",
+    "history",
+    "cli",
+)
+
+# Provider SDKs that must load on first use, never at import
+HEAVY = ("openai", "replicate", "requests_toolbelt", "torch", "diffusers", "numpy")
+
+
+def measure(module):
+    # -> (cumulative import time in µs, set of imported top-level packages)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    cumulative = None
+    imported = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        name = name.strip()
+        imported.add(name.split(".")[0])
+        if name == module:
+            cumulative = int(total)
+    return cumulative, imported
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check `python -X importtime` for the cold-start modules "
+        "against a recorded baseline."
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="best of N runs")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5, help="allowed relative slowdown"
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="record the current timings"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = {}
+    if os.path.exists(BASELINE) and not args.update:
+        with open(BASELINE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["modules"]
+
+    failures = []
+    timings = {}
+    for module in MODULES:
+        runs = [measure(module) for _ in range(args.repeat)]
+        timings[module] = min(total for total, _ in runs)
+
+        leaked = sorted(set(HEAVY) & runs[0][1])
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked)} eagerly")
+
+        limit = baseline.get(module, {}).get("us")
+        status = ""
+        if baseline and not limit:
+            failures.append(f"{module} has no baseline (run with --update)")
+            status = "  << no baseline"
+        if limit and timings[module] > limit * (1 + args.tolerance):
+            failures.append(
+                f"{module} takes {timings[module] / 1000:.1f} ms "
+                f"(baseline {limit / 1000:.1f} ms)"
+            )
+            status = "  << slower"
+        print(f"{module:10} {timings[module] / 1000:8.1f} ms{status}", file=sys.stderr)
+
+    if args.update:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": sys.version.split()[0],
+                    "modules": {m: {"us": us} for m, us in timings.items()},
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"Saved {BASELINE}", file=sys.stderr)
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
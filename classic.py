@@ -0,0 +1,121 @@
+from PIL import Image, ImageOps
+import io
+import numpy as np
+
+
+# Classic Cartoon Defaults (no model, no network: smoothing + edges + palette)
+COLORS = 8  # palette size (k-means)
+RADIUS = 4  # edge-preserving smoothing window radius (pixels)
+EPSILON = 0.02  # smoothing strength: higher flattens stronger edges too
+EDGE_THRESHOLD = 0.12  # Sobel magnitude (0..1) drawn as an ink line
+EDGE_DARKEN = 0.15  # ink lines keep this much of the underlying color
+BLOCK_ROWS = 256  # rows per block: bounds float working memory on large photos
+PALETTE_SIDE = 256  # k-means is fitted on a thumbnail this size
+KMEANS_ITERATIONS = 8
+
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def box_mean(a, r):
+    # Mean over a (2r+1)^2 window (edge-padded) in O(1) per pixel: separable
+    # running sums keep float32 error independent of the image size
+    k = 2 * r + 1
+    rest = ((0, 0),) * (a.ndim - 2)
+    c = np.pad(a, ((r + 1, r), (0, 0)) + rest, mode="edge").cumsum(0)
+    a = c[k:] - c[:-k]
+    c = np.pad(a, ((0, 0), (r + 1, r)) + rest, mode="edge").cumsum(1)
+    return (c[:, k:] - c[:, :-k]) / (k * k)
+
+
+def smooth(rgb, r=RADIUS, eps=EPSILON):
+    # Self-guided filter per channel: flattens texture, keeps strong edges
+    mean = box_mean(rgb, r)
+    var = box_mean(rgb * rgb, r) - mean * mean
+    a = var / (var + eps)
+    b = mean - a * mean
+    return box_mean(a, r) * rgb + box_mean(b, r)
+
+
+def edges(rgb, threshold=EDGE_THRESHOLD):
+    # Boolean ink mask from the Sobel gradient magnitude of the luma
+    p = np.pad(rgb @ LUMA, 1, mode="edge")
+    gx = (p[:-2, 2:] + 2 * p[1:-1, 2:] + p[2:, 2:]) - (
+        p[:-2, :-2] + 2 * p[1:-1, :-2] + p[2:, :-2]
+    )
+    gy = (p[2:, :-2] + 2 * p[2:, 1:-1] + p[2:, 2:]) - (
+        p[:-2, :-2] + 2 * p[:-2, 1:-1] + p[:-2, 2:]
+    )
+    return np.hypot(gx, gy) / 4 > threshold
+
+
+def nearest(pixels, centers):
+    # Index of the closest center per pixel (|x|^2 is constant per row, dropped)
+    distances = (centers * centers).sum(1) - 2 * pixels @ centers.T
+    return distances.argmin(1)
+
+
+def fit_palette(image, colors=COLORS, r=RADIUS, eps=EPSILON, seed=0):
+    # k-means (k-means++ init) on a smoothed thumbnail -> (colors, 3) float32
+    thumb = image.copy()
+    thumb.thumbnail((PALETTE_SIDE, PALETTE_SIDE))
+    scale = PALETTE_SIDE / max(image.size)
+    rgb = np.asarray(thumb, dtype=np.float32) / 255
+    pixels = smooth(rgb, max(1, round(r * scale)), eps).reshape(-1, 3)
+
+    rng = np.random.default_rng(seed)
+    centers = [pixels[rng.integers(len(pixels))]]
+    for _ in range(1, colors):
+        d = ((pixels[:, None, :] - np.array(centers)[None]) ** 2).sum(2).min(1)
+        centers.append(pixels[rng.choice(len(pixels), p=d / d.sum())])
+    centers = np.array(centers, dtype=np.float32)
+
+    for _ in range(KMEANS_ITERATIONS):
+        labels = nearest(pixels, centers)
+        counts = np.bincount(labels, minlength=colors)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled, None]
+    return centers
+
+
+def cartoonize(
+    image,
+    colors=COLORS,
+    r=RADIUS,
+    eps=EPSILON,
+    threshold=EDGE_THRESHOLD,
+    block_rows=BLOCK_ROWS,
+):
+    # PIL image -> cartoon PIL image; rows are processed in blocks with a
+    # halo wide enough to match a whole-image pass (up to float rounding)
+    image = image.convert("RGB")
+    width, height = image.size
+    palette = fit_palette(image, colors, r, eps)
+    ink = (palette * EDGE_DARKEN * 255).astype(np.uint8)
+    flat = (palette * 255).astype(np.uint8)
+    halo = 2 * r + 1
+
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    for top in range(0, height, block_rows):
+        bottom = min(height, top + block_rows)
+        lo, hi = max(0, top - halo), min(height, bottom + halo)
+        rgb = np.asarray(image.crop((0, lo, width, hi)), dtype=np.float32) / 255
+
+        smoothed = smooth(rgb, r, eps)
+        mask = edges(smoothed, threshold)[top - lo : bottom - lo]
+        smoothed = smoothed[top - lo : bottom - lo]
+
+        labels = nearest(smoothed.reshape(-1, 3), palette).reshape(mask.shape)
+        out[top:bottom] = np.where(mask[..., None], ink[labels], flat[labels])
+    return Image.fromarray(out)
+
+
+def cartoonize_bytes(data, max_side=None, **options):
+    # Encoded photo -> PNG bytes (same input the remote providers receive)
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    cartoonize(image, **options).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
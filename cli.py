@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import batch
+import core
+import metrics
+import preprocess
+import router
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cartoonize a directory or manifest of images/prompts without a browser."
+    )
+    parser.add_argument(
+        "input",
+        help="directory of photos, or a JSONL manifest "
+        '({"image": ..., "prompt": ..., "style": ..., "ratio": ..., "id": ...} per line)',
+    )
+    parser.add_argument("-o", "--output", default="output", help="output directory")
+    parser.add_argument("--env", default=".env", help="configuration file")
+    parser.add_argument("--style", default="Pixar Disney", help="default cartoon style")
+    parser.add_argument("--prompt", default="", help="default user prompt")
+    parser.add_argument("--ratio", default="1:1", help="aspect ratio for photos")
+    parser.add_argument("--size", default="1024x1024", help="image size for prompts")
+    parser.add_argument("--change", type=float, default=0.75, help="strength")
+    parser.add_argument("--scale", type=float, default=10, help="guidance scale")
+    parser.add_argument(
+        "--provider",
+        choices=("replicate", "auto", "classic"),
+        default="replicate",
+        help="photo backend (auto: fastest healthy provider, hedged; "
+        "classic: local NumPy engine, no network)",
+    )
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="workers")
+    parser.add_argument(
+        "--fresh", action="store_true", help="ignore the checkpoint and redo everything"
+    )
+    return parser.parse_args(argv)
+
+
+def load_items(args):
+    # Directory: one item per photo; manifest: one item per JSON line
+    if os.path.isdir(args.input):
+        names = sorted(
+            name
+            for name in os.listdir(args.input)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        entries = [{"image": os.path.join(args.input, name)} for name in names]
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for entry in entries:
+        item = {
+            "image": entry.get("image"),
+            "prompt": entry.get("prompt", args.prompt),
+            "style": entry.get("style", args.style),
+            "ratio": entry.get("ratio", args.ratio),
+            "size": entry.get("size", args.size),
+        }
+        if not item["image"] and not item["prompt"]:
+            raise ValueError(f"Manifest entry needs an image or a prompt: {entry}")
+
+        source = os.path.basename(item["image"]) if item["image"] else item["prompt"]
+        item["id"] = entry.get("id") or f"{source}|{item['style']}"
+        items.append(item)
+    return items
+
+
+def output_name(item_id):
+    # Readable, filesystem-safe and still unique per item id
+    digest = hashlib.sha1(item_id.encode("utf-8")).hexdigest()[:8]
+    stem = re.sub(r"[^\w.-]+", "_", item_id).strip("_")[:100]
+    return f"{stem}_{digest}"
+
+
+def load_checkpoint(path, output_dir):
+    # Items logged as ok whose output still exists are done
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            if record.get("status") == "ok" and os.path.exists(
+                os.path.join(output_dir, record["output"])
+            ):
+                done.add(record["id"])
+    return done
+
+
+def run_item(config, args, item):
+    if item["image"]:
+        with open(item["image"], "rb") as f:
+            prepared = preprocess.prepare_image(f.read(), aspect_ratio=item["ratio"])
+        if args.provider == "auto":
+            request = router.CartoonRequest(
+                prepared,
+                item["style"],
+                item["prompt"],
+                args.change,
+                args.scale,
+                item["ratio"],
+            )
+            return router.get_router(config).run(request)[1]
+        if args.provider == "classic":
+            import classic
+
+            return classic.cartoonize_bytes(prepared.data)
+
+        generation_input = core.build_style_input(
+            item["style"], item["prompt"], args.change, args.scale, item["ratio"]
+        )
+        return core.cartoonize_photo(config, prepared, generation_input)
+
+    assistant_prompt, _, _ = core.style_settings(item["style"], 0, 0)
+    return core.cartoonize_text(
+        config, item["style"], assistant_prompt, item["prompt"], item["size"]
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = core.load_config(args.env)
+    metrics.setup(config.get("METRICS_PORT"), config.get("METRICS_LOG"))
+    os.makedirs(args.output, exist_ok=True)
+
+    # Resume from Checkpoint (results log doubles as the checkpoint)
+    log_path = os.path.join(args.output, "results.jsonl")
+    done = set() if args.fresh else load_checkpoint(log_path, args.output)
+    items = [item for item in load_items(args) if item["id"] not in done]
+    print(f"{len(done)} done, {len(items)} to go", file=sys.stderr)
+
+    failed = 0
+    with open(log_path, "a", encoding="utf-8") as log:
+        for result in batch.run_batch(
+            [(item["id"], item) for item in items],
+            lambda item: run_item(config, args, item),
+            max_workers=args.concurrency,
+        ):
+            item = items[result.index]
+            record = {
+                "id": item["id"],
+                "input": {k: v for k, v in item.items() if k != "id"},
+                "seconds": round(result.seconds, 3),
+            }
+
+            if result.ok:
+                filename = (
+                    f"{output_name(item['id'])}.{batch.guess_extension(result.data)}"
+                )
+                with open(os.path.join(args.output, filename), "wb") as f:
+                    f.write(result.data)
+                record.update(status="ok", output=filename)
+            else:
+                failed += 1
+                record.update(status="error", error=result.error)
+
+            # One durable line per finished item: a crash loses at most in-flight work
+            log.write(json.dumps(record, ensure_ascii=False) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+
+            print(
+                f"[{record['status']}] {item['id']} ({result.seconds:.1f}s)",
+                file=sys.stderr,
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+import base64
+import batch
+import cache
+import http_client
+import jobs
+import metrics
+import settings
+import storage
+import threading
+
+
+# Configuration Keys (.env / Streamlit secrets / process environment)
+CONFIG_KEYS = (
+    "CUSTOM_LOGIN_ID",
+    "CUSTOM_LOGIN_PW",
+    "CUSTOM_LANGUAGE",
+    "CLOUDFLARE_ACCOUNT_ID",
+    "CLOUDFLARE_API_URL",
+    "CLOUDFLARE_API_TOKEN_IMAGES",
+    "OPENAI_API_KEY",
+    "OPENAI_MODEL_TTI",
+    "OPENAI_MODEL_DRAW",
+    "OPENAI_API_URL",
+    "REPLICATE_API_TOKEN",
+    "REPLICATE_MODEL_ITI",
+    "REPLICATE_MODEL_DRAW",
+    "REPLICATE_API_URL",
+    "METRICS_PORT",
+    "METRICS_LOG",
+    "DIFFUSERS_DTYPE",
+    "DIFFUSERS_SCHEDULER",
+    "DIFFUSERS_STEPS",
+    "DIFFUSERS_COMPILE",
+    "DIFFUSERS_THREADS",
+    "DIFFUSERS_MAX_BATCH",
+    "DIFFUSERS_MAX_WAIT",
+)
+
+
+# Style Presets (assistant prompt & per-style strength/scale overrides)
+STYLE_PRESETS = {
+    "Pixar Disney": {
+        "assistant_prompt": "A charming animated character in the style of classic Disney movies, with large expressive eyes, soft facial features, a whimsical and friendly smile, elegant proportions, smooth and clean line art, colorful and polished look, magical fairy-tale costume, warm and glowing lighting, set in a dreamy fantasy background, capturing the spirit of innocence and wonder,",
+    },
+    "Marvel Hero": {
+        "assistant_prompt": "A powerful superhero character in the style of Marvel Comics, wearing a futuristic, high-tech suit with glowing elements, dynamic pose, detailed musculature, dramatic lighting, cinematic shadows, vibrant color palette, comic book realism, heroic expression, action-packed background, intense atmosphere, inspired by characters like Iron Man, Spider-Man, and Captain Marvel,",
+        "change": 0.5,
+    },
+    "Studio Ghibli": {
+        "assistant_prompt": "A dreamy, hand-painted fantasy scene inspired by Studio Ghibli, rendered in soft pastel tones. Lush, gently swaying grass fields, delicate wildflowers, and a small child with a curious gaze standing beneath a wide, cloud-filled sky. Warm, golden sunlight filtering through the clouds, creating a peaceful, nostalgic mood. Light watercolor textures, painterly brushstrokes, and subtle glowing dust particles in the air. Whimsical creatures or forest spirits watching from afar, evoking a sense of magic and wonder. Inspired by 'My Neighbor Totoro' and 'Spirited Away', with a gentle Japanese countryside atmosphere,",
+        "change": 0.65,
+        "scale": 12,
+    },
+    "K-Pop Star": {
+        "assistant_prompt": "",
+    },
+}
+WORKER_URL = "https://cartoonize.toweringcloud.workers.dev"
+# app.py styles the Cloudflare worker knows (see app_cloudflare.py)
+WORKER_STYLES = {
+    "Pixar Disney": "disney",
+    "Studio Ghibli": "ghibli",
+    "K-Pop Star": "k-pop idol",
+}
+NEGATIVE_PROMPT = "disfigured, kitsch, ugly, oversaturated, greain, low-res, deformed, blurry, bad anatomy, poorly drawn face, mutation, mutated, extra limb, poorly drawn hands, missing limb, floating limbs, disconnected limbs, malformed hands, blur, out of focus, long neck, long body, disgusting, poorly drawn, childish, mutilated, mangled, old, surreal, calligraphy, sign, writing, watermark, text, body out of frame, extra legs, extra arms, extra feet, out of frame, poorly drawn feet, cross-eye"
+
+
+def load_config(path=".env"):
+    # .env first, then the process environment (e.g. CI secrets) overrides it
+    return settings.load_config(path, CONFIG_KEYS)
+
+
+# Process-wide OpenAI Clients (SDK loaded on first use)
+_openai_clients = {}
+_openai_clients_lock = threading.Lock()
+
+
+def openai_client(config):
+    key = (config["OPENAI_API_KEY"], config.get("OPENAI_API_URL"))
+    with _openai_clients_lock:
+        if key not in _openai_clients:
+            import openai
+
+            _openai_clients[key] = openai.OpenAI(api_key=key[0], base_url=key[1])
+        return _openai_clients[key]
+
+
+def style_settings(style_name, change, scale):
+    # (assistant prompt, strength, guidance scale) with per-style overrides
+    preset = STYLE_PRESETS.get(style_name, {})
+    return (
+        preset.get("assistant_prompt", ""),
+        preset.get("change", change),
+        preset.get("scale", scale),
+    )
+
+
+def build_generation_input(
+    style_name, assistant_prompt, user_prompt, change, scale, aspect_ratio
+):
+    prompt_plus = f"""
+        A cartoon version of the input image, maintaining the same pose, background and facial expression. 
+        Clean lines, bright colors, {style_name} style, but with the original subject's identity preserved. 
+        {assistant_prompt if len(assistant_prompt) > 0 else ""}
+        {user_prompt if len(user_prompt) > 5 else ""}
+    """
+    return {
+        "prompt": prompt_plus,
+        "negative_prompt": NEGATIVE_PROMPT,
+        "prompt_strength": change,
+        "strength": change,
+        "guidance_scale": scale,
+        "output_quality": 90,
+        "num_inference_steps": 30,
+        "num_outputs": 1,
+        "aspect_ratio": aspect_ratio,
+    }
+
+
+def build_style_input(style_name, user_prompt, change, scale, aspect_ratio):
+    # Replicate input for one preset style (fan-out, CLI)
+    assistant_prompt, change, scale = style_settings(style_name, change, scale)
+    return build_generation_input(
+        style_name, assistant_prompt, user_prompt, change, scale, aspect_ratio
+    )
+
+
+def build_text_prompt(style_name, assistant_prompt, user_prompt):
+    return f"""
+        {style_name} style of cartoon, 
+        {assistant_prompt if len(assistant_prompt) > 0 else ""}
+        {user_prompt}
+    """
+
+
+def upload_image(config, prepared, cancel_event=None):
+    with batch.provider_slot("cloudflare", cancel_event):
+        return storage.upload_image_to_storage(
+            prepared.data,
+            prepared.filename,
+            config["CLOUDFLARE_API_URL"],
+            config["CLOUDFLARE_ACCOUNT_ID"],
+            config["CLOUDFLARE_API_TOKEN_IMAGES"],
+            prepared.mime_type,
+        )
+
+
+def cartoonize_photo(
+    config, prepared, generation_input, image_url=None, cancel_event=None
+):
+    # Blocking upload -> transform chain, safe for worker threads (no st.* calls)
+    model = config["REPLICATE_MODEL_ITI"]
+    result_cache = cache.get_result_cache()
+    result_key = cache.cache_key(prepared.data, {"model": model, **generation_input})
+    cartoon = result_cache.get(result_key)
+    if cartoon is not None:
+        return cartoon
+
+    if image_url is None:
+        image_url = upload_image(config, prepared, cancel_event)
+
+    # A hedge cancelled while queued leaves without starting a paid prediction
+    with batch.provider_slot("replicate", cancel_event):
+        job = jobs.PredictionJob(
+            jobs.create_client(
+                config["REPLICATE_API_TOKEN"], config.get("REPLICATE_API_URL")
+            ),
+            model,
+            {"image": image_url, **generation_input},
+        )
+        job.start().wait(cancel_event=cancel_event)
+
+    if job.status != "succeeded":
+        raise RuntimeError(job.error or f"Prediction {job.status}")
+
+    cartoon = cache.read_result(job.output)
+    result_cache.put(result_key, cartoon)
+    return cartoon
+
+
+def worker_cache_key(prepared, worker_style):
+    return cache.cache_key(prepared.data, {"model": WORKER_URL, "style": worker_style})
+
+
+def cartoonize_with_worker(
+    prepared, worker_style, upload_config=None, cancel_event=None
+):
+    # Photo-to-cartoon using the Cloudflare worker -> image bytes
+    # (upload_config: also keep the original in Cloudflare Images first)
+    result_cache = cache.get_result_cache()
+    result_key = worker_cache_key(prepared, worker_style)
+    cartoon = result_cache.get(result_key)
+    if cartoon is not None:
+        return cartoon
+
+    if upload_config is not None:
+        upload_image(upload_config, prepared, cancel_event)
+
+    files = {"file": prepared.data, "style": worker_style}
+    with batch.provider_slot("cloudflare", cancel_event), metrics.track(
+        "transform", "cloudflare-worker"
+    ):
+        response = http_client.post(WORKER_URL, files=files, timeout=(5, 120))
+
+        variants = []
+        if response.status_code == 200:
+            variants = response.json().get("result", {}).get("variants", [])
+        if not variants:
+            raise RuntimeError(
+                f"Worker failed to transform: HTTP {response.status_code}"
+            )
+
+    cartoon = cache.read_result(variants[0])
+    result_cache.put(result_key, cartoon)
+    return cartoon
+
+
+def read_image(data):
+    # OpenAI image item -> bytes (inline base64, or a URL that will expire)
+    if data.b64_json:
+        return base64.b64decode(data.b64_json)
+    return cache.read_result(data.url)
+
+
+def cartoonize_prompt(config, prompt, size):
+    # Text-to-image using the OpenAI images API -> image bytes
+    client = openai_client(config)
+    with batch.provider_slot("openai"), metrics.track("generate", "openai"):
+        response = client.images.generate(
+            model=config["OPENAI_MODEL_TTI"],
+            size=size,
+            prompt=prompt,
+            response_format="b64_json",
+            n=1,
+        )
+    return read_image(response.data[0])
+
+
+def text_cache_key(config, style_name, assistant_prompt, user_prompt, size):
+    return cache.prompt_cache_key(
+        config["OPENAI_MODEL_TTI"],
+        user_prompt,
+        style_name,
+        size,
+        assistant_prompt=cache.normalize_prompt(assistant_prompt),
+    )
+
+
+def cartoonize_text(config, style_name, assistant_prompt, user_prompt, size):
+    # cartoonize_prompt behind the normalized-prompt cache -> image bytes
+    prompt_cache = cache.get_prompt_cache()
+    prompt_key = text_cache_key(config, style_name, assistant_prompt, user_prompt, size)
+    cartoon = prompt_cache.get(prompt_key)
+    if cartoon is None:
+        prompt = build_text_prompt(style_name, assistant_prompt, user_prompt)
+        cartoon = cartoonize_prompt(config, prompt, size)
+        prompt_cache.put(prompt_key, cartoon)
+    return cartoon
@@ -0,0 +1,107 @@
+import base64
+import cache
+import io
+import metrics
+import threading
+
+
+# Vision Input (a small JPEG is plenty for a short description, and cheap)
+DESCRIBE_SIDE = 512
+DESCRIBE_QUALITY = 80
+DESCRIBE_PROMPT = "Describe this cartoon-style image briefly in {language}."
+
+
+def encode_for_vision(image, max_side=DESCRIBE_SIDE, quality=DESCRIBE_QUALITY):
+    # PIL image -> downscaled JPEG bytes (also the content address for the cache)
+    image = image.convert("RGB")
+    image.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class Description:
+    # Streams one image description from a background thread; the caller can
+    # show the image first and read the text as it arrives (or from the cache)
+    def __init__(self, client, model, image, language):
+        self.data = encode_for_vision(image)
+        self.key = cache.cache_key(
+            self.data, {"task": "describe", "model": model, "language": language}
+        )
+        self.error = None
+        self._chunks = []
+        self._done = False
+        self._condition = threading.Condition()
+
+        cached = cache.get_description_cache().get(self.key)
+        if cached is not None:
+            self._chunks.append(cached.decode("utf-8"))
+            self._done = True
+        else:
+            threading.Thread(
+                target=self._run,
+                args=(client, model, language),
+                name="describe",
+                daemon=True,
+            ).start()
+
+    def _run(self, client, model, language):
+        image_url = "data:image/jpeg;base64," + base64.b64encode(self.data).decode()
+        try:
+            with metrics.track("describe", "openai"):
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": DESCRIBE_PROMPT.format(language=language),
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {"url": image_url, "detail": "low"},
+                                },
+                            ],
+                        }
+                    ],
+                    stream=True,
+                )
+                for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        with self._condition:
+                            self._chunks.append(text)
+                            self._condition.notify_all()
+            cache.get_description_cache().put(self.key, self.text.encode("utf-8"))
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def text(self):
+        with self._condition:
+            return "".join(self._chunks)
+
+    def stream(self):
+        # Yields text chunks as they arrive (st.write_stream-compatible)
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._chunks) and not self._done:
+                    self._condition.wait()
+                if index >= len(self._chunks):
+                    break
+                chunks = self._chunks[index:]
+                index = len(self._chunks)
+            yield from chunks
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,268 @@
+import threading
+import time
+
+
+CONTROLNET_MODEL = "lllyasviel/control_v11f1e_sd15_tile"
+DIFFUSION_MODEL = "runwayml/stable-diffusion-v1-5"
+
+# Inference Steps (CPU trades a little detail for a usable latency)
+GPU_STEPS = 30
+CPU_STEPS = 12
+
+# Faster Schedulers (converge in fewer steps than the default PNDM)
+SCHEDULERS = {
+    "default": None,  # keep the model's own scheduler
+    "dpm": "DPMSolverMultistepScheduler",
+    "unipc": "UniPCMultistepScheduler",
+    "euler_a": "EulerAncestralDiscreteScheduler",
+}
+CPU_SCHEDULER = "dpm"
+
+DTYPES = {"fp16": "float16", "bf16": "bfloat16", "fp32": "float32"}
+
+# Step Previews (SD 1.5 latent channels -> approximate RGB, no VAE decode)
+LATENT_RGB_FACTORS = (
+    (0.298, 0.207, 0.208),
+    (0.187, 0.286, 0.173),
+    (-0.158, 0.189, 0.264),
+    (-0.184, -0.271, -0.473),
+)
+PREVIEW_EVERY = 3  # steps
+PREVIEW_SIDE = 256
+
+
+# Process-wide Pipeline Registry (shared by every Streamlit session & rerun)
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def select_device(prefer_bf16=False):
+    import torch  # torch/diffusers load on first use, not at app import
+
+    if torch.cuda.is_available():
+        return "cuda", torch.float16
+    if prefer_bf16:
+        return "cpu", torch.bfloat16
+    return "cpu", torch.float32
+
+
+def resolve(device=None, dtype=None):
+    # dtype may be a torch dtype or one of DTYPES ("bf16", "fp32", ...)
+    import torch
+
+    if isinstance(dtype, str):
+        dtype = getattr(torch, DTYPES[dtype])
+    if device is None:
+        device, default_dtype = select_device(prefer_bf16=dtype == torch.bfloat16)
+        dtype = dtype or default_dtype
+    elif dtype is None:
+        dtype = torch.float16 if device == "cuda" else torch.float32
+    return device, dtype
+
+
+def set_threads(threads=None, interop_threads=None):
+    # Intra-op threads ~ physical cores; fewer when several sessions share a node
+    import torch
+
+    if threads:
+        torch.set_num_threads(int(threads))
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(int(interop_threads))
+        except RuntimeError:
+            pass  # only settable before the first parallel op
+
+
+def options_from_config(config):
+    # DIFFUSERS_* settings -> keyword arguments for get_pipeline()/generate()
+    def flag(name):
+        return str(config.get(name) or "").lower() in ("1", "true", "yes", "on")
+
+    return {
+        "dtype": config.get("DIFFUSERS_DTYPE") or None,
+        "scheduler": config.get("DIFFUSERS_SCHEDULER") or None,
+        "compile": flag("DIFFUSERS_COMPILE"),
+        "steps": int(config.get("DIFFUSERS_STEPS") or 0) or None,
+    }
+
+
+def pipeline_key(device, dtype, scheduler=None, compile=False):
+    return (CONTROLNET_MODEL, DIFFUSION_MODEL, device, str(dtype), scheduler, compile)
+
+
+def pipeline_status():
+    if not _registry:
+        # Nothing loaded yet: answer without importing torch
+        return {"state": "cold"}
+
+    entry = max(_registry.values(), key=lambda entry: entry["loaded_at"])
+    return {
+        "state": "warm",
+        "device": entry["device"],
+        "dtype": entry["dtype"],
+        "scheduler": entry["scheduler"],
+        "load_seconds": entry["load_seconds"],
+        "loaded_at": entry["loaded_at"],
+    }
+
+
+def optimize(pipe, device, scheduler=None, compile=False):
+    import diffusers
+    import torch
+
+    if SCHEDULERS.get(scheduler):
+        scheduler_class = getattr(diffusers, SCHEDULERS[scheduler])
+        pipe.scheduler = scheduler_class.from_config(pipe.scheduler.config)
+
+    if device == "cpu":
+        # NHWC convolutions are markedly faster with oneDNN on CPU
+        for module in (pipe.unet, pipe.controlnet, pipe.vae):
+            module.to(memory_format=torch.channels_last)
+
+        # Bound peak memory on small nodes (attention in slices, VAE in tiles)
+        pipe.enable_attention_slicing()
+        pipe.enable_vae_tiling()
+
+    if compile:
+        # First call pays the compile; later calls reuse the graph
+        pipe.unet = torch.compile(pipe.unet)
+
+    pipe.set_progress_bar_config(disable=True)
+    return pipe
+
+
+def get_pipeline(device=None, dtype=None, scheduler=None, compile=False):
+    device, dtype = resolve(device, dtype)
+    if scheduler is None and device == "cpu":
+        scheduler = CPU_SCHEDULER
+
+    key = pipeline_key(device, dtype, scheduler, compile)
+    entry = _registry.get(key)
+    if entry is not None:
+        return entry["pipe"]
+
+    # Build once: concurrent sessions wait on the lock instead of loading twice
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is None:
+            from diffusers import ControlNetModel, StableDiffusionControlNetPipeline
+
+            started = time.perf_counter()
+
+            # Load ControlNet Model
+            controlnet = ControlNetModel.from_pretrained(
+                CONTROLNET_MODEL, torch_dtype=dtype
+            )
+
+            # Setup Stable Diffusion Pipeline
+            pipe = StableDiffusionControlNetPipeline.from_pretrained(
+                DIFFUSION_MODEL,
+                controlnet=controlnet,
+                torch_dtype=dtype,
+            ).to(device)
+            pipe = optimize(pipe, device, scheduler, compile)
+
+            entry = {
+                "pipe": pipe,
+                "device": device,
+                "dtype": str(dtype),
+                "scheduler": scheduler,
+                "load_seconds": time.perf_counter() - started,
+                "loaded_at": time.time(),
+            }
+            _registry[key] = entry
+
+    return entry["pipe"]
+
+
+def generate(
+    prompt, image, steps=None, device=None, dtype=None, scheduler=None, compile=False
+):
+    # -> PIL image; steps default to GPU_STEPS on CUDA, CPU_STEPS on CPU
+    import torch
+
+    device, dtype = resolve(device, dtype)
+    pipe = get_pipeline(device, dtype, scheduler, compile)
+    if steps is None:
+        steps = GPU_STEPS if device == "cuda" else CPU_STEPS
+
+    with torch.inference_mode():
+        return pipe(prompt=prompt, image=image, num_inference_steps=steps).images[0]
+
+
+def generate_batch(
+    prompts,
+    images,
+    steps=None,
+    device=None,
+    dtype=None,
+    scheduler=None,
+    compile=False,
+    callback=None,
+):
+    # One pipeline call for same-size images -> [PIL image, ...] in input order
+    #   callback(step, steps, latents) runs after every step; returning True
+    #   skips the remaining steps and decodes the latents as they are
+    import torch
+
+    device, dtype = resolve(device, dtype)
+    pipe = get_pipeline(device, dtype, scheduler, compile)
+    if steps is None:
+        steps = GPU_STEPS if device == "cuda" else CPU_STEPS
+
+    kwargs = {}
+    if callback is not None:
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            if callback(step + 1, steps, callback_kwargs["latents"]):
+                pipe._interrupt = True
+            return callback_kwargs
+
+        kwargs["callback_on_step_end"] = on_step_end
+
+    with torch.inference_mode():
+        return pipe(
+            prompt=list(prompts),
+            image=list(images),
+            num_inference_steps=steps,
+            **kwargs,
+        ).images
+
+
+def latents_to_preview(latents, max_side=PREVIEW_SIDE):
+    # (1, 4, h, w) latents -> small PIL image via a linear projection (~1 ms)
+    from PIL import Image
+    import torch
+
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32)
+    rgb = torch.einsum("chw,cr->hwr", latents[0].float().cpu(), factors)
+    rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).byte().numpy()
+    image = Image.fromarray(rgb)
+    scale = max_side / max(image.size)
+    size = (round(image.width * scale), round(image.height * scale))
+    return image.resize(size, Image.BILINEAR)
+
+
+class StepPreview:
+    # Follows one request: latest preview image, step count and a stop flag
+    def __init__(self, every=PREVIEW_EVERY, max_side=PREVIEW_SIDE):
+        self.every = every
+        self.max_side = max_side
+        self.step = 0
+        self.total = None
+        self.image = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        # Keep the current result: the run ends after the step in progress
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def __call__(self, step, total, latents):
+        self.step, self.total = step, total
+        if step % self.every == 0 or step == total:
+            self.image = latents_to_preview(latents, self.max_side)
+        return self.stopped
@@ -0,0 +1,192 @@
+import cache
+import hashlib
+import json
+import os
+import results
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+HISTORY_DB = os.path.join(".cache", "history.sqlite3")
+OUTPUTS_DIR = os.path.join(".cache", "history")
+PAGE_SIZE = 12
+
+# Gallery rows carry no image bytes: thumbnails live in their own table and
+# are read per visible item, originals stay on disk until an entry is opened
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    input_hash TEXT,
+    style TEXT,
+    provider TEXT,
+    params TEXT,
+    latency REAL,
+    result_id TEXT NOT NULL,
+    caption TEXT
+);
+CREATE INDEX IF NOT EXISTS generations_user_time
+    ON generations (user, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS generations_user_input
+    ON generations (user, input_hash, created_at DESC);
+CREATE TABLE IF NOT EXISTS thumbnails (
+    result_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+COLUMNS = (
+    "id",
+    "created_at",
+    "input_hash",
+    "style",
+    "provider",
+    "params",
+    "latency",
+    "result_id",
+    "caption",
+)
+
+
+def input_hash(source):
+    # Photo bytes, or a prompt (normalized like the prompt cache) -> hex digest
+    if isinstance(source, str):
+        source = cache.normalize_prompt(source).encode("utf-8")
+    return hashlib.sha256(source).hexdigest()
+
+
+class HistoryStore:
+    # Per-user generation log in SQLite; outputs kept on disk (no TTL/LRU)
+    def __init__(self, path=HISTORY_DB, directory=OUTPUTS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _path(self, result_id):
+        return os.path.join(self.directory, result_id)
+
+    def record(
+        self,
+        user,
+        data,
+        input_hash=None,
+        style=None,
+        provider=None,
+        params=None,
+        latency=None,
+        caption=None,
+        thumbnail=None,
+    ):
+        result_id = results.result_id(data)
+        path = self._path(result_id)
+        if not os.path.exists(path):
+            # Atomic write: a concurrent reader never sees a partial output
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        if thumbnail is None:
+            thumbnail = results.render(data, "thumb")
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO thumbnails VALUES (?, ?)",
+                (result_id, thumbnail),
+            )
+            cursor = self._db.execute(
+                "INSERT INTO generations (user, created_at, input_hash, style,"
+                " provider, params, latency, result_id, caption)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user,
+                    time.time(),
+                    input_hash,
+                    style,
+                    provider,
+                    json.dumps(params, sort_keys=True, default=str) if params else None,
+                    latency,
+                    result_id,
+                    caption,
+                ),
+            )
+        return cursor.lastrowid
+
+    def _rows(self, query, args):
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(zip(COLUMNS, row))
+            entry["params"] = json.loads(entry["params"]) if entry["params"] else {}
+            entries.append(entry)
+        return entries
+
+    def page(self, user, cursor=None, limit=PAGE_SIZE):
+        # Keyset pagination (newest first): pass the previous page's `cursor`
+        # back in; cost stays flat however deep the user pages
+        query = f"SELECT {', '.join(COLUMNS)} FROM generations WHERE user = ?"
+        args = [user]
+        if cursor is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            args.extend(cursor)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        entries = self._rows(query, args + [limit + 1])
+
+        following = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            following = (entries[-1]["created_at"], entries[-1]["id"])
+        return entries, following
+
+    def count(self, user):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM generations WHERE user = ?", (user,)
+            ).fetchone()[0]
+
+    def find(self, user, input_hash, limit=PAGE_SIZE):
+        # Earlier results for the same photo/prompt, newest first
+        return self._rows(
+            f"SELECT {', '.join(COLUMNS)} FROM generations"
+            " WHERE user = ? AND input_hash = ?"
+            " ORDER BY created_at DESC LIMIT ?",
+            (user, input_hash, limit),
+        )
+
+    def thumbnail(self, result_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM thumbnails WHERE result_id = ?", (result_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def output(self, result_id):
+        try:
+            with open(self._path(result_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+# Process-wide History Store (one SQLite connection for every session)
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store():
+    global _history_store
+
+    if _history_store is None:
+        with _history_store_lock:
+            if _history_store is None:
+                _history_store = HistoryStore()
+    return _history_store
@@ -0,0 +1,149 @@
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+import random
+import threading
+import time
+import requests
+
+
+# Pool & Retry Settings (tunable via configure())
+POOL_CONNECTIONS = 8  # distinct hosts kept alive
+POOL_MAXSIZE = 32  # keep-alive connections per host
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+DEFAULT_TIMEOUT = (5, 60)  # (connect, read) seconds
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses where the server rejected the request before doing any work,
+# so even a non-idempotent POST (e.g. an image upload) is safe to resend
+REJECTED_STATUSES = {429, 503}
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure(
+    pool_connections=None,
+    pool_maxsize=None,
+    max_retries=None,
+    backoff_base=None,
+    backoff_max=None,
+):
+    global POOL_CONNECTIONS, POOL_MAXSIZE, MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX
+    global _session
+
+    with _session_lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if max_retries is not None:
+            MAX_RETRIES = max_retries
+        if backoff_base is not None:
+            BACKOFF_BASE = backoff_base
+        if backoff_max is not None:
+            BACKOFF_MAX = backoff_max
+
+        # Rebuild the pool on next use with the new sizes
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    max_retries=0,  # retries are handled in request()
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    # Full jitter: uniform(0, base * 2^attempt), capped; Retry-After wins
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2**attempt)))
+
+
+def request(method, url, idempotent=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+
+    session = get_session()
+    attempt = 0
+    while True:
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.ConnectionError as e:
+            # A connect failure never reached the server; anything after
+            # the request was sent may have been processed already
+            not_sent = isinstance(e, requests.ConnectTimeout) or _is_connect_error(e)
+            if attempt >= MAX_RETRIES or not (idempotent or not_sent):
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+        except requests.Timeout:
+            # Read timeout: the server may still be working on the request
+            if attempt >= MAX_RETRIES or not idempotent:
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        retryable = response.status_code in (
+            RETRY_STATUSES if idempotent else REJECTED_STATUSES
+        )
+        if not retryable or attempt >= MAX_RETRIES:
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        response.close()
+        time.sleep(backoff_delay(attempt, retry_after))
+        attempt += 1
+
+
+def _is_connect_error(error):
+    # urllib3 wraps NewConnectionError (DNS, refused) inside MaxRetryError
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request("HEAD", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
@@ -0,0 +1,270 @@
+import admission
+import threading
+import time
+import uuid
+import metrics
+
+
+TERMINAL_STATES = {"succeeded", "failed", "canceled"}
+
+# Adaptive Polling: back off while queued, poll briskly while processing
+POLL_INTERVALS = {
+    "queued": (1.0, 5.0),  # (first, max) seconds between polls
+    "processing": (0.5, 2.0),
+}
+BACKOFF_FACTOR = 1.5
+
+# Abandoned Jobs: a session that stops polling is gone (tab closed, navigated away)
+ABANDON_AFTER = 30
+REAP_INTERVAL = 5
+KEEP_FINISHED = 300
+
+
+# Process-wide Clients (one connection pool per token/endpoint, SDK loaded on first use)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def create_client(api_token, base_url=None):
+    # base_url lets the job layer run against a local fake Replicate endpoint
+    key = (api_token, base_url)
+    with _clients_lock:
+        if key not in _clients:
+            import replicate
+
+            if base_url:
+                _clients[key] = replicate.Client(api_token=api_token, base_url=base_url)
+            else:
+                _clients[key] = replicate.Client(api_token=api_token)
+        return _clients[key]
+
+
+class PredictionJob:
+    def __init__(self, client, model, input, owner=None, user=None):
+        self.client = client
+        self.model = model
+        self.input = input
+        self.owner = owner
+        self.user = user
+        self.key = uuid.uuid4().hex  # registry id, known before the prediction exists
+        self.ticket = None
+        self.prediction = None
+        self._start_error = None
+        self._canceled = False
+        self.started_at = None
+        self.finished_at = None
+        self.last_polled = 0.0
+        self.last_seen = time.time()
+        self._interval = None
+        self._interval_state = None
+        self._metrics_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def id(self):
+        return self.prediction.id if self.prediction is not None else None
+
+    @property
+    def status(self):
+        if self.prediction is not None:
+            return self.prediction.status
+        if self._start_error is not None:
+            return "failed"
+        return "canceled" if self._canceled else "pending"
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATES
+
+    @property
+    def logs(self):
+        return (self.prediction.logs or "") if self.prediction is not None else ""
+
+    @property
+    def output(self):
+        return self.prediction.output if self.prediction is not None else None
+
+    @property
+    def error(self):
+        if self.prediction is not None:
+            return self.prediction.error
+        return self._start_error
+
+    @property
+    def queue_position(self):
+        # 0 = next to start; None when not waiting for a slot
+        if self.ticket is None or self.prediction is not None:
+            return None
+        return admission.get_controller().position(self.ticket)
+
+    @property
+    def estimated_wait(self):
+        position = self.queue_position
+        if position is None:
+            return 0.0
+        return admission.get_controller().estimated_wait("replicate", position)
+
+    def enqueue(self):
+        # Wait for a replicate slot without blocking: poll() starts the job
+        # once admitted, and the slot is released when it reaches a terminal state
+        self.ticket = admission.get_controller().enqueue("replicate", self.user)
+        return self
+
+    def start(self):
+        # The "predict" stage spans create -> terminal state, across polls
+        self._metrics_started = metrics.begin("predict", "replicate")
+        try:
+            # "owner/name:version" pins a version, "owner/name" runs the latest
+            if ":" in self.model:
+                version = self.model.split(":", 1)[1]
+                self.prediction = self.client.predictions.create(
+                    version=version, input=self.input
+                )
+            else:
+                self.prediction = self.client.models.predictions.create(
+                    model=self.model, input=self.input
+                )
+        except Exception as e:
+            self._record_metrics(e)
+            raise
+
+        self.started_at = self.last_polled = time.time()
+        return self
+
+    def _record_metrics(self, error=None):
+        # Exactly once per started job (and the admission slot goes with it)
+        if self._metrics_started is not None:
+            started, self._metrics_started = self._metrics_started, None
+            metrics.end("predict", "replicate", started, error, prediction=self.id)
+        if self.ticket is not None:
+            admission.get_controller().release(self.ticket)
+
+    def poll_interval(self):
+        state = "processing" if self.status == "processing" else "queued"
+        if self._interval_state != state:
+            self._interval_state = state
+            self._interval = POLL_INTERVALS[state][0]
+        return self._interval
+
+    def poll(self):
+        # Every poll is also a heartbeat from the session that owns the job
+        self.last_seen = time.time()
+
+        with self._lock:
+            if self.prediction is None and self.ticket is not None and not self.done:
+                if self.ticket.admitted:
+                    try:
+                        self.start()
+                    except Exception as e:
+                        self._start_error = str(e) or type(e).__name__
+                        self.finished_at = time.time()
+                return self.status
+
+            if self.prediction is None or self.done:
+                return self.status
+
+            now = time.time()
+            interval = self.poll_interval()
+            if now - self.last_polled >= interval:
+                self.prediction.reload()
+                self.last_polled = now
+
+                maximum = POLL_INTERVALS[self._interval_state][1]
+                self._interval = min(maximum, interval * BACKOFF_FACTOR)
+
+                if self.done:
+                    self.finished_at = now
+                    self._record_metrics(
+                        None if self.status == "succeeded" else self.status
+                    )
+            return self.status
+
+    def wait(self, timeout=None, cancel_event=None):
+        # Blocking variant for worker threads (batch mode, CLI, hedged requests)
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.done:
+            if deadline is not None and time.time() > deadline:
+                self.cancel()
+                raise TimeoutError(f"Prediction {self.id} timed out")
+
+            if cancel_event is None:
+                time.sleep(self.poll_interval())
+            elif cancel_event.wait(self.poll_interval()):
+                self.cancel()
+                break
+            self.poll()
+        return self
+
+    def cancel(self):
+        with self._lock:
+            if self.prediction is None and not self.done:
+                # Still waiting for a slot: just leave the queue
+                self._canceled = True
+                self.finished_at = time.time()
+                if self.ticket is not None:
+                    admission.get_controller().release(self.ticket)
+            elif self.prediction is not None and not self.done:
+                self.prediction.cancel()
+                self.finished_at = time.time()
+                self._record_metrics("canceled")
+
+
+class JobRegistry:
+    def __init__(self, abandon_after=ABANDON_AFTER, reap_interval=REAP_INTERVAL):
+        self.abandon_after = abandon_after
+        self.reap_interval = reap_interval
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def submit(self, job):
+        # Queued behind other sessions' predictions; started by poll() once admitted
+        job.enqueue().poll()
+        with self._lock:
+            self._jobs[job.key] = job
+            if self._reaper is None:
+                self._reaper = threading.Thread(
+                    target=self._reap_forever, name="prediction-reaper", daemon=True
+                )
+                self._reaper.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def reap(self):
+        now = time.time()
+        with self._lock:
+            jobs = list(self._jobs.values())
+
+        for job in jobs:
+            if not job.done and now - job.last_seen > self.abandon_after:
+                # Nobody is watching: stop paying for it
+                try:
+                    job.cancel()
+                except Exception:
+                    pass  # retried on the next sweep
+            elif job.done and now - (job.finished_at or now) > KEEP_FINISHED:
+                with self._lock:
+                    self._jobs.pop(job.key, None)
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            self.reap()
+
+
+# Process-wide Job Registry (shared by every Streamlit session & rerun)
+_job_registry = None
+_job_registry_lock = threading.Lock()
+
+
+def get_job_registry():
+    global _job_registry
+
+    if _job_registry is None:
+        with _job_registry_lock:
+            if _job_registry is None:
+                _job_registry = JobRegistry()
+    return _job_registry
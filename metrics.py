@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+
+# Latency Buckets (seconds): uploads sit at the low end, predictions at the high end
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._values = {}  # labels -> ([count per bucket], sum, count)
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(c), s, n) for key, (c, s, n) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", key + (("le", bound),), bucket_count
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), count
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, count
+
+
+# Stage Metrics (stage: upload, predict, generate, transform, fetch, render)
+STAGE_SECONDS = Histogram(
+    "cartoonize_stage_seconds", "Time spent per pipeline stage and provider."
+)
+STAGE_REQUESTS = Counter(
+    "cartoonize_stage_requests_total", "Finished stage calls per provider."
+)
+STAGE_ERRORS = Counter(
+    "cartoonize_stage_errors_total", "Failed stage calls per provider and error."
+)
+IN_FLIGHT = Gauge("cartoonize_in_flight", "Stage calls currently running.")
+
+# Inference Scheduler Metrics (shared batched pipeline calls)
+QUEUE_DEPTH = Gauge(
+    "cartoonize_queue_depth", "Requests waiting for a batched inference call."
+)
+BATCH_SIZE = Histogram(
+    "cartoonize_batch_size",
+    "Requests served per batched inference call.",
+    buckets=(1, 2, 4, 8, 16),
+)
+
+# Admission Control Metrics (per-provider slots & per-user rate limits)
+ADMISSION_QUEUE = Gauge(
+    "cartoonize_admission_queue", "Provider calls waiting for a concurrency slot."
+)
+ADMISSION_ACTIVE = Gauge(
+    "cartoonize_admission_active", "Provider calls holding a concurrency slot."
+)
+RATE_LIMITED = Counter(
+    "cartoonize_rate_limited_total", "Requests refused by a per-user token bucket."
+)
+REGISTRY = [
+    STAGE_SECONDS,
+    STAGE_REQUESTS,
+    STAGE_ERRORS,
+    IN_FLIGHT,
+    QUEUE_DEPTH,
+    BATCH_SIZE,
+    ADMISSION_QUEUE,
+    ADMISSION_ACTIVE,
+    RATE_LIMITED,
+]
+
+
+def render():
+    # Prometheus text exposition format (version 0.0.4)
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Structured Request Log (one JSON object per line, off unless configured)
+_log_file = None
+_log_lock = threading.Lock()
+
+
+def _log(record):
+    if _log_file is None:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _log_lock:
+        _log_file.write(line + "\n")
+        _log_file.flush()
+
+
+def begin(stage, provider):
+    # For stages that outlive one call stack (e.g. polled predictions)
+    IN_FLIGHT.inc(stage=stage, provider=provider)
+    return time.perf_counter()
+
+
+def end(stage, provider, started, error=None, **fields):
+    # error: an exception, a terminal status like "canceled", or None on success
+    seconds = time.perf_counter() - started
+    IN_FLIGHT.dec(stage=stage, provider=provider)
+    STAGE_SECONDS.observe(seconds, stage=stage, provider=provider)
+    STAGE_REQUESTS.inc(stage=stage, provider=provider)
+
+    if isinstance(error, BaseException):
+        error = type(error).__name__
+    if error is not None:
+        STAGE_ERRORS.inc(stage=stage, provider=provider, error=error)
+
+    _log(
+        {
+            "ts": time.time(),
+            "stage": stage,
+            "provider": provider,
+            "seconds": round(seconds, 4),
+            "ok": error is None,
+            "error": error,
+            **fields,
+        }
+    )
+    return seconds
+
+
+@contextmanager
+def track(stage, provider, **fields):
+    # Usage: with metrics.track("upload", "cloudflare"): ...
+    started = begin(stage, provider)
+    try:
+        yield
+    except BaseException as e:
+        end(stage, provider, started, e, **fields)
+        raise
+    end(stage, provider, started, **fields)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Process-wide Exporter (every Streamlit session/rerun shares one endpoint)
+_server = None
+_server_lock = threading.Lock()
+
+
+def setup(port=None, log_path=None, host="127.0.0.1"):
+    # Idempotent: serve /metrics on the port and open the JSON log, once each
+    global _server, _log_file
+
+    with _server_lock:
+        if port and _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(
+                target=_server.serve_forever, name="metrics-exporter", daemon=True
+            ).start()
+        if log_path and _log_file is None:
+            _log_file = open(log_path, "a", encoding="utf-8")
+    return _server
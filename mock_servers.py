@@ -0,0 +1,271 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+import argparse
+import base64
+import io
+import itertools
+import json
+import re
+import threading
+import time
+
+
+# Simulated Provider Latency (seconds)
+#   cloudflare: per upload request, openai: per generation request,
+#   replicate: time a prediction spends "processing" before it succeeds
+DEFAULT_LATENCY = {
+    "cloudflare": 0.05,
+    "replicate": 1.0,
+    "openai": 0.5,
+}
+
+
+def parse_latency(text):
+    # "replicate=2,openai=0.3" -> {"replicate": 2.0, "openai": 0.3, ...}
+    latency = dict(DEFAULT_LATENCY)
+    for part in filter(None, (text or "").split(",")):
+        name, _, seconds = part.partition("=")
+        if name.strip() not in DEFAULT_LATENCY:
+            raise ValueError(f"Unknown provider {name!r}")
+        latency[name.strip()] = float(seconds)
+    return latency
+
+
+def sample_image(size=(512, 512), format="PNG"):
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body=b"", content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path.startswith("/files/"):
+            return self._send(200, state.output_image, "image/png")
+
+        match = re.fullmatch(r"/v1/predictions/([\w-]+)", self.path)
+        if match:
+            prediction = state.get_prediction(match.group(1))
+            if prediction is None:
+                return self._send(404, {"detail": "Not found"})
+            return self._send(200, prediction)
+
+        self._send(404, {"detail": "Not found"})
+
+    def do_POST(self):
+        state = self.server.state
+        body = self._read_body()
+
+        # Cloudflare Images: POST {api_url}/{account_id}/images/v1
+        if self.path.endswith("/images/v1"):
+            time.sleep(state.latency["cloudflare"])
+            image_id = state.next_id("img")
+            return self._send(
+                200,
+                {
+                    "success": True,
+                    "result": {
+                        "id": image_id,
+                        "variants": [f"{state.url}/files/{image_id}/public"],
+                    },
+                },
+            )
+
+        # Replicate: create (pinned version or latest of a model) / cancel
+        if self.path == "/v1/predictions" or re.fullmatch(
+            r"/v1/models/[\w.-]+/[\w.-]+/predictions", self.path
+        ):
+            request = json.loads(body or b"{}")
+            model = self.path[len("/v1/models/") : -len("/predictions")]
+            return self._send(
+                201,
+                state.create_prediction(
+                    model if self.path != "/v1/predictions" else "",
+                    request.get("version", ""),
+                    request.get("input", {}),
+                ),
+            )
+
+        match = re.fullmatch(r"/v1/predictions/([\w-]+)/cancel", self.path)
+        if match:
+            prediction = state.cancel_prediction(match.group(1))
+            if prediction is None:
+                return self._send(404, {"detail": "Not found"})
+            return self._send(200, prediction)
+
+        # OpenAI: POST /v1/images/generations
+        if self.path == "/v1/images/generations":
+            time.sleep(state.latency["openai"])
+            request = json.loads(body or b"{}")
+            if request.get("response_format") == "b64_json":
+                item = {"b64_json": base64.b64encode(state.output_image).decode()}
+            else:
+                item = {"url": f"{state.url}/files/{state.next_id('dalle')}"}
+            return self._send(200, {"created": int(time.time()), "data": [item]})
+
+        self._send(404, {"detail": "Not found"})
+
+
+class MockState:
+    def __init__(self, latency):
+        self.latency = latency
+        self.url = None
+        self.output_image = sample_image()
+        self._predictions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self, prefix):
+        return f"{prefix}-{next(self._ids)}"
+
+    def create_prediction(self, model, version, input):
+        prediction_id = self.next_id("pred")
+        with self._lock:
+            self._predictions[prediction_id] = {
+                "id": prediction_id,
+                "model": model,
+                "version": version,
+                "input": input,
+                "created": time.time(),
+                "canceled": False,
+            }
+        return self.get_prediction(prediction_id)
+
+    def cancel_prediction(self, prediction_id):
+        with self._lock:
+            if prediction_id not in self._predictions:
+                return None
+            self._predictions[prediction_id]["canceled"] = True
+        return self.get_prediction(prediction_id)
+
+    def get_prediction(self, prediction_id):
+        with self._lock:
+            record = self._predictions.get(prediction_id)
+        if record is None:
+            return None
+
+        # Status is derived from age, so polling cost is what gets measured
+        done = time.time() - record["created"] >= self.latency["replicate"]
+        if record["canceled"]:
+            status = "canceled"
+        else:
+            status = "succeeded" if done else "processing"
+
+        return {
+            "id": prediction_id,
+            "model": record["model"],
+            "version": record["version"],
+            "status": status,
+            "input": record["input"],
+            "output": (
+                [f"{self.url}/files/{prediction_id}.png"]
+                if status == "succeeded"
+                else None
+            ),
+            "logs": "",
+            "error": None,
+            "metrics": {},
+            "created_at": None,
+            "started_at": None,
+            "completed_at": None,
+            "urls": {
+                "get": f"{self.url}/v1/predictions/{prediction_id}",
+                "cancel": f"{self.url}/v1/predictions/{prediction_id}/cancel",
+            },
+        }
+
+
+class MockProviders:
+    # Local stand-ins for Cloudflare Images, Replicate and OpenAI images
+    def __init__(self, latency=None, host="127.0.0.1", port=0):
+        self.state = MockState(dict(latency or DEFAULT_LATENCY))
+        self.server = ThreadingHTTPServer((host, port), MockHandler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        self.state.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    @property
+    def url(self):
+        return self.state.url
+
+    def config(self):
+        # Drop-in replacement for core.load_config() pointing at this server
+        return {
+            "CLOUDFLARE_ACCOUNT_ID": "mock-account",
+            "CLOUDFLARE_API_URL": f"{self.url}/client/v4/accounts",
+            "CLOUDFLARE_API_TOKEN_IMAGES": "mock-token",
+            "OPENAI_API_KEY": "mock-key",
+            "OPENAI_MODEL_TTI": "dall-e-3",
+            "OPENAI_API_URL": f"{self.url}/v1",
+            "REPLICATE_API_TOKEN": "mock-token",
+            "REPLICATE_MODEL_ITI": "mock/cartoonize",
+            "REPLICATE_API_URL": self.url,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="mock-providers", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve local stand-ins for the Cloudflare, Replicate and OpenAI APIs."
+    )
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument(
+        "--latency",
+        default="",
+        help="per-provider seconds, e.g. replicate=2,openai=0.3,cloudflare=0.05",
+    )
+    args = parser.parse_args(argv)
+
+    providers = MockProviders(parse_latency(args.latency), port=args.port)
+    print("Point .env at the mock providers:")
+    for key, value in providers.config().items():
+        print(f"{key}={value}")
+    try:
+        providers.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        providers.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from PIL import Image, ImageOps
+import io
+
+
+# Rotation Options (degrees counter-clockwise -> lossless transpose)
+ROTATIONS = {
+    0: None,
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+FORMATS = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+@dataclass
+class PreparedImage:
+    image: Image.Image
+    data: bytes
+    mime_type: str
+    original_size: int
+
+    @property
+    def saved_bytes(self):
+        return self.original_size - len(self.data)
+
+    @property
+    def filename(self):
+        return "upload." + self.mime_type.split("/")[1].replace("jpeg", "jpg")
+
+
+def parse_aspect_ratio(aspect_ratio):
+    # "16:9" -> 16 / 9, None/"" -> keep original framing
+    if not aspect_ratio:
+        return None
+    width, height = aspect_ratio.split(":")
+    return int(width) / int(height)
+
+
+def center_crop(image, ratio):
+    width, height = image.size
+    if ratio is None or abs(width / height - ratio) < 0.01:
+        return image
+
+    if width / height > ratio:
+        new_width = round(height * ratio)
+        left = (width - new_width) // 2
+        return image.crop((left, 0, left + new_width, height))
+    else:
+        new_height = round(width / ratio)
+        top = (height - new_height) // 2
+        return image.crop((0, top, width, top + new_height))
+
+
+def prepare_image(
+    image_bytes,
+    rotation=0,
+    aspect_ratio=None,
+    max_side=1024,
+    format="JPEG",
+    quality=88,
+):
+    image = Image.open(io.BytesIO(image_bytes))
+
+    # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding
+    if image.format == "JPEG":
+        image.draft("RGB", (max_side, max_side))
+
+    # Apply EXIF Orientation & User Rotation
+    image = ImageOps.exif_transpose(image)
+    if ROTATIONS[rotation % 360] is not None:
+        image = image.transpose(ROTATIONS[rotation % 360])
+
+    # Center-crop to Aspect Ratio & Downsample to Working Resolution
+    image = center_crop(image, parse_aspect_ratio(aspect_ratio))
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    # Re-encode without metadata (EXIF/ICC/XMP are not carried over)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if format == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+
+    return PreparedImage(
+        image=image,
+        data=buffer.getvalue(),
+        mime_type=FORMATS[format],
+        original_size=len(image_bytes),
+    )
@@ -0,0 +1,98 @@
+from PIL import Image
+import cache
+import hashlib
+import io
+import os
+import threading
+
+
+RESULTS_DIR = os.path.join(".cache", "renditions")
+
+# Pre-rendered Renditions: (longest side in px, WebP quality)
+RENDITIONS = {
+    "thumb": (256, 75),
+    "display": (1024, 85),
+}
+
+
+def result_id(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def render(data, rendition):
+    side, quality = RENDITIONS[rendition]
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (side, side))  # JPEG: decode at reduced scale
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.thumbnail((side, side), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def regrade(data, grade, rendition):
+    # Color grade an already-rendered image (3D LUT, no new generation)
+    import lut  # numpy loads only when a result is actually graded
+
+    image = lut.apply(Image.open(io.BytesIO(data)), grade)
+    buffer = io.BytesIO()
+    if rendition == "original":
+        image.save(buffer, format="PNG", compress_level=1)
+    else:
+        image.save(buffer, format="WEBP", quality=RENDITIONS[rendition][1], method=4)
+    return buffer.getvalue()
+
+
+class ResultStore:
+    # Provider outputs downloaded once: original + WebP renditions, size-bounded LRU on disk
+    def __init__(self, directory=RESULTS_DIR, max_bytes=512 * 1024 * 1024):
+        self.disk = cache.DiskCache(directory, max_bytes=max_bytes)
+
+    def put(self, data):
+        key = result_id(data)
+        if self.disk.get(f"{key}.original") is None:
+            self.disk.put(f"{key}.original", data)
+            for rendition in RENDITIONS:
+                self.disk.put(f"{key}.{rendition}", render(data, rendition))
+        return key
+
+    def fetch(self, output):
+        # Provider URL/FileOutput -> result id (the link may expire, the bytes won't)
+        return self.put(cache.read_result(output))
+
+    def get(self, key, rendition="display", grade=None):
+        if grade is not None:
+            # Graded variants are derived from the ungraded rendition on demand
+            data = self.disk.get(f"{key}.{rendition}.{grade}")
+            if data is None:
+                source = self.get(key, rendition)
+                if source is not None:
+                    data = regrade(source, grade, rendition)
+                    self.disk.put(f"{key}.{rendition}.{grade}", data)
+            return data
+
+        data = self.disk.get(f"{key}.{rendition}")
+        if data is None and rendition != "original":
+            # Rendition evicted before its original: render it again
+            original = self.disk.get(f"{key}.original")
+            if original is not None:
+                data = render(original, rendition)
+                self.disk.put(f"{key}.{rendition}", data)
+        return data
+
+
+# Process-wide Result Store (shared by every Streamlit session & rerun)
+_result_store = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store():
+    global _result_store
+
+    if _result_store is None:
+        with _result_store_lock:
+            if _result_store is None:
+                _result_store = ResultStore()
+    return _result_store
@@ -0,0 +1,287 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+import io
+import threading
+import time
+import core
+import metrics
+import preprocess
+
+
+# Rolling Window & Health Thresholds
+WINDOW = 100  # samples kept per provider
+MIN_SAMPLES = 5  # below this a provider is still being explored
+MAX_ERROR_RATE = 0.5
+HEDGE_DELAY = 20.0  # seconds before hedging when p95 is still unknown
+MIN_HEDGE_DELAY = 2.0  # never hedge sooner (cache hits drag p95 down)
+
+
+@dataclass
+class CartoonRequest:
+    prepared: preprocess.PreparedImage
+    style: str
+    user_prompt: str = ""
+    change: float = 0.75
+    scale: float = 10
+    aspect_ratio: str = "1:1"
+
+
+class LatencyStats:
+    def __init__(self, window=WINDOW):
+        self._samples = deque(maxlen=window)  # (seconds, ok)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._samples.append((seconds, ok))
+
+    def percentile(self, q):
+        with self._lock:
+            latencies = sorted(s for s, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    @property
+    def count(self):
+        return len(self._samples)
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return 0.0
+        return sum(1 for _, ok in samples if not ok) / len(samples)
+
+    @property
+    def healthy(self):
+        return self.count < MIN_SAMPLES or self.error_rate < MAX_ERROR_RATE
+
+
+class Provider:
+    name = None
+
+    def supports(self, request):
+        return True
+
+    def cartoonize(self, request, cancel_event):
+        raise NotImplementedError
+
+
+class ReplicateProvider(Provider):
+    name = "replicate"
+
+    def __init__(self, config):
+        self.config = config
+
+    def cartoonize(self, request, cancel_event):
+        generation_input = core.build_style_input(
+            request.style,
+            request.user_prompt,
+            request.change,
+            request.scale,
+            request.aspect_ratio,
+        )
+        return core.cartoonize_photo(
+            self.config, request.prepared, generation_input, cancel_event=cancel_event
+        )
+
+
+class CloudflareWorkerProvider(Provider):
+    name = "cloudflare-worker"
+
+    def supports(self, request):
+        return request.style in core.WORKER_STYLES
+
+    def cartoonize(self, request, cancel_event):
+        # Leaves the queue when cancelled; an in-flight POST can't be recalled
+        return core.cartoonize_with_worker(
+            request.prepared,
+            core.WORKER_STYLES[request.style],
+            cancel_event=cancel_event,
+        )
+
+
+class DiffusersProvider(Provider):
+    name = "diffusers"
+
+    def __init__(self, options=None, limits=None):
+        self.options = options or {}
+        self.limits = limits
+
+    def cartoonize(self, request, cancel_event):
+        import scheduler
+
+        # Queued with other sessions' requests; a lost hedge leaves the queue
+        with metrics.track("transform", "diffusers"):
+            image = scheduler.generate(
+                f"high quality, {request.style} cartoon style",
+                request.prepared.image,
+                cancel_event=cancel_event,
+                limits=self.limits,
+                **self.options,
+            )
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+class ClassicProvider(Provider):
+    # Local NumPy engine: no network, no GPU; the last resort when all else fails
+    name = "classic"
+
+    def cartoonize(self, request, cancel_event):
+        import classic
+
+        with metrics.track("transform", "classic"):
+            return classic.cartoonize_bytes(request.prepared.data)
+
+
+class Router:
+    def __init__(self, providers, hedge=True, max_workers=16, fallback=None):
+        self.providers = providers
+        self.hedge = hedge
+        self.fallback = fallback
+        self.stats = {
+            provider.name: LatencyStats()
+            for provider in providers + ([fallback] if fallback else [])
+        }
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="router"
+        )
+
+    def ranked(self, request):
+        # Healthy first; unexplored providers get tried; then fastest p50
+        def rank(provider):
+            stats = self.stats[provider.name]
+            p50 = stats.percentile(0.5)
+            return (
+                not stats.healthy,
+                stats.count >= MIN_SAMPLES,
+                p50 if p50 is not None else 0.0,
+            )
+
+        return sorted(
+            (p for p in self.providers if p.supports(request)),
+            key=rank,
+        )
+
+    def _attempt(self, provider, request, cancel_event):
+        started = time.perf_counter()
+        try:
+            result = provider.cartoonize(request, cancel_event)
+        except Exception:
+            if not cancel_event.is_set():
+                self.stats[provider.name].record(time.perf_counter() - started, False)
+            raise
+        if not cancel_event.is_set():
+            self.stats[provider.name].record(time.perf_counter() - started, True)
+        return provider.name, result
+
+    def _submit(self, provider, request, running):
+        cancel_event = threading.Event()
+        future = self._pool.submit(self._attempt, provider, request, cancel_event)
+        running[future] = (provider, cancel_event)
+
+    def run(self, request):
+        # -> (provider name, image bytes); hedges a slow primary, fails over on errors
+        candidates = self.ranked(request)
+        if not candidates:
+            raise RuntimeError(f"No provider supports style {request.style!r}")
+
+        running = {}  # future -> (provider, cancel event)
+        errors = []
+        primary = candidates.pop(0)
+        self._submit(primary, request, running)
+        hedged = False
+
+        try:
+            while running:
+                timeout = None
+                if self.hedge and not hedged and candidates:
+                    p95 = self.stats[primary.name].percentile(0.95)
+                    timeout = max(MIN_HEDGE_DELAY, p95 or HEDGE_DELAY)
+
+                done, _ = wait(
+                    list(running), timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    # Primary is slower than its own p95: race a second backend
+                    self._submit(candidates.pop(0), request, running)
+                    hedged = True
+                    continue
+
+                for future in done:
+                    provider, _ = running.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {e}")
+
+                # Every in-flight attempt failed: fail over to the next provider
+                if not running and candidates:
+                    primary = candidates.pop(0)
+                    self._submit(primary, request, running)
+                    hedged = False
+        finally:
+            # Cancel the loser(s)
+            for _, cancel_event in running.values():
+                cancel_event.set()
+
+        # Every remote backend is down or rate-limited: cartoonize locally
+        if self.fallback is not None:
+            try:
+                return self._attempt(self.fallback, request, threading.Event())
+            except Exception as e:
+                errors.append(f"{self.fallback.name}: {e}")
+
+        raise RuntimeError("All providers failed: " + "; ".join(errors))
+
+    def snapshot(self):
+        rows = []
+        for provider in self.providers + ([self.fallback] if self.fallback else []):
+            stats = self.stats[provider.name]
+            rows.append(
+                {
+                    "provider": provider.name,
+                    "samples": stats.count,
+                    "p50": stats.percentile(0.5),
+                    "p95": stats.percentile(0.95),
+                    "error_rate": stats.error_rate,
+                    "healthy": stats.healthy,
+                }
+            )
+        return rows
+
+
+def default_providers(config):
+    providers = [ReplicateProvider(config), CloudflareWorkerProvider()]
+    if config.get("ENABLE_DIFFUSERS"):
+        import diffusion
+        import scheduler
+
+        providers.append(
+            DiffusersProvider(
+                diffusion.options_from_config(config),
+                scheduler.limits_from_config(config),
+            )
+        )
+    return providers
+
+
+# Process-wide Router (latency stats are shared by every session)
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router(config):
+    global _router
+
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router(default_providers(config), fallback=ClassicProvider())
+    return _router
@@ -0,0 +1,162 @@
+from concurrent.futures import CancelledError, Future
+import threading
+import time
+import metrics
+
+
+# Batching Window (a batch closes when it is full or its oldest request has waited)
+MAX_BATCH_SIZE = 4
+MAX_WAIT = 0.1  # seconds
+
+
+class InferenceScheduler:
+    # Collects requests from every session and serves compatible ones together
+    #   run_batch(key, [payload, ...]) -> [result, ...] in the same order;
+    #   only requests with an equal key (resolution, steps, options) share a call
+    def __init__(
+        self, run_batch, name, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT
+    ):
+        self.run_batch = run_batch
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = []  # FIFO of (key, payload, future, enqueued_at)
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, key, payload):
+        future = Future()
+        with self._condition:
+            self._queue.append((key, payload, future, time.monotonic()))
+            self._report_depth()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name=f"scheduler-{self.name}", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    @property
+    def depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _report_depth(self):
+        metrics.QUEUE_DEPTH.set(len(self._queue), provider=self.name)
+
+    def _next_batch(self):
+        with self._condition:
+            while True:
+                # Requests cancelled while queued never reach the device
+                self._queue = [r for r in self._queue if not r[2].cancelled()]
+                if not self._queue:
+                    self._report_depth()
+                    self._condition.wait()
+                    continue
+
+                # Oldest request decides the key, so no group starves another
+                key, _, _, enqueued_at = self._queue[0]
+                batch = [r for r in self._queue if r[0] == key]
+                batch = batch[: self.max_batch_size]
+                remaining = enqueued_at + self.max_wait - time.monotonic()
+                if len(batch) >= self.max_batch_size or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            self._queue = [r for r in self._queue if not any(r is b for b in batch)]
+            self._report_depth()
+        return key, batch
+
+    def _worker(self):
+        while True:
+            key, batch = self._next_batch()
+            batch = [r for r in batch if r[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            metrics.BATCH_SIZE.observe(len(batch), provider=self.name)
+            try:
+                results = self.run_batch(key, [payload for _, payload, _, _ in batch])
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+def wait(future, cancel_event=None, poll=0.1):
+    # Blocking result; a set cancel_event withdraws a still-queued request
+    if cancel_event is None:
+        return future.result()
+    while not cancel_event.wait(poll):
+        if future.done():
+            return future.result()
+    future.cancel()
+    raise CancelledError()
+
+
+def limits_from_config(config):
+    # DIFFUSERS_MAX_BATCH / DIFFUSERS_MAX_WAIT -> get_diffusion_scheduler() kwargs
+    return {
+        "max_batch_size": int(config.get("DIFFUSERS_MAX_BATCH") or MAX_BATCH_SIZE),
+        "max_wait": float(config.get("DIFFUSERS_MAX_WAIT") or MAX_WAIT),
+    }
+
+
+def _run_diffusion(key, payloads):
+    import diffusion  # torch/diffusers load only when the local backend is used
+
+    _, steps, options = key
+    prompts, images, previews = zip(*payloads)
+
+    def callback(step, total, latents):
+        # Each request sees its own latents; the call stops early only
+        # once every request in the batch has asked to stop
+        stop = True
+        for i, preview in enumerate(previews):
+            if preview is None or not preview(step, total, latents[i : i + 1]):
+                stop = False
+        return stop
+
+    with metrics.track("inference", "diffusers", batch_size=len(payloads)):
+        return diffusion.generate_batch(
+            prompts,
+            images,
+            steps=steps,
+            callback=callback if any(previews) else None,
+            **dict(options),
+        )
+
+
+# Process-wide Diffusion Scheduler (one queue in front of the shared pipeline)
+_diffusion_scheduler = None
+_diffusion_scheduler_lock = threading.Lock()
+
+
+def get_diffusion_scheduler(max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+    global _diffusion_scheduler
+
+    if _diffusion_scheduler is None:
+        with _diffusion_scheduler_lock:
+            if _diffusion_scheduler is None:
+                _diffusion_scheduler = InferenceScheduler(
+                    _run_diffusion, "diffusers", max_batch_size, max_wait
+                )
+    return _diffusion_scheduler
+
+
+def submit(prompt, image, steps=None, limits=None, preview=None, **options):
+    # -> Future of one PIL image; same-size images with equal settings batch up
+    #   preview: optional diffusion.StepPreview for step previews & early stop
+    key = (image.size, steps, tuple(sorted(options.items())))
+    return get_diffusion_scheduler(**(limits or {})).submit(
+        key, (prompt, image, preview)
+    )
+
+
+def generate(prompt, image, steps=None, cancel_event=None, limits=None, **options):
+    # Drop-in for diffusion.generate() that shares a batched call with other sessions
+    future = submit(prompt, image, steps=steps, limits=limits, **options)
+    return wait(future, cancel_event)
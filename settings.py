@@ -0,0 +1,77 @@
+from dotenv import dotenv_values
+import importlib
+import os
+import threading
+
+
+# Modules the warm-up imports ahead of the first request that needs them
+WARM_UP_MODULES = (
+    "openai",
+    "replicate",
+    "requests_toolbelt.multipart.encoder",
+)
+
+
+# Process-wide Configuration Cache (parsed once, re-read only when .env changes)
+_configs = {}
+_configs_lock = threading.Lock()
+
+
+def load_config(path=".env", env_keys=()):
+    # .env values, then the process environment overrides env_keys
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        mtime = None
+
+    key = (path, tuple(env_keys))
+    with _configs_lock:
+        cached = _configs.get(key)
+        if cached is None or cached[0] != mtime:
+            config = dict(dotenv_values(path))
+            config.update({k: os.environ[k] for k in env_keys if k in os.environ})
+            cached = _configs[key] = (mtime, config)
+    return dict(cached[1])
+
+
+# Background Warm-up (once per process, after the first page is out)
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def _warm_up(modules, urls, tasks):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass  # optional backend not installed here
+
+    # Open pooled keep-alive connections (DNS + TLS) before the first upload
+    import http_client
+
+    for url in urls:
+        try:
+            http_client.head(url, timeout=(5, 5))
+        except Exception:
+            pass
+
+    for task in tasks:
+        try:
+            task()
+        except Exception:
+            pass  # the real request will surface the error
+
+
+def warm_up(modules=WARM_UP_MODULES, urls=(), tasks=()):
+    global _warm_up_thread
+
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(
+                target=_warm_up,
+                args=(modules, [url for url in urls if url], tasks),
+                name="warm-up",
+                daemon=True,
+            )
+            _warm_up_thread.start()
+    return _warm_up_thread
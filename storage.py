@@ -0,0 +1,162 @@
+import hashlib
+import http_client
+import io
+import json
+import metrics
+import os
+import tempfile
+import threading
+import time
+import requests
+
+
+INDEX_PATH = os.path.join(".cache", "uploads.json")
+
+
+class UploadError(Exception):
+    pass
+
+
+def upload_image(
+    image_bytes, filename, api_url, account_id, api_key, content_type="image/jpeg"
+):
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+    encoder = MultipartEncoder(
+        fields={"file": (filename, io.BytesIO(image_bytes), content_type)}
+    )
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": encoder.content_type,
+    }
+
+    IMAGE_UPLOAD_URL = f"{api_url}/{account_id}/images/v1"
+    with metrics.track("upload", "cloudflare"):
+        # Buffer the (already downsized) body so a retry can resend it
+        response = http_client.post(
+            IMAGE_UPLOAD_URL, headers=headers, data=encoder.to_string()
+        )
+
+        if response.status_code == 200:
+            return response.json()["result"]["variants"][0]
+        else:
+            raise UploadError(response.text)
+
+
+class UploadIndex:
+    # Persistent content hash -> Cloudflare Images variant URL
+    def __init__(
+        self,
+        path=INDEX_PATH,
+        max_entries=10000,
+        max_age=30 * 86400,
+        verify_after=86400,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.verify_after = verify_after
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        # Atomic write: a crash never leaves a truncated index behind
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def _is_alive(self, url):
+        try:
+            response = http_client.head(url, timeout=5, allow_redirects=True)
+        except requests.RequestException:
+            return False
+        return response.status_code == 200
+
+    def get(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None:
+            return None
+
+        # Evict by age, re-check unverified entries against the CDN
+        now = time.time()
+        stale = now - entry["uploaded_at"] > self.max_age
+        if not stale and now - entry["verified_at"] > self.verify_after:
+            stale = not self._is_alive(entry["url"])
+            if not stale:
+                with self._lock:
+                    entry["verified_at"] = now
+                    self._save()
+
+        if stale:
+            self.remove(key)
+            return None
+        return entry["url"]
+
+    def put(self, key, url):
+        with self._lock:
+            entries = self._load()
+            now = time.time()
+            entries[key] = {"url": url, "uploaded_at": now, "verified_at": now}
+
+            # Evict by count: keep the most recently uploaded entries
+            if len(entries) > self.max_entries:
+                ordered = sorted(entries.items(), key=lambda e: e[1]["uploaded_at"])
+                for old_key, _ in ordered[: len(entries) - self.max_entries]:
+                    del entries[old_key]
+
+            self._save()
+
+    def remove(self, key):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+
+# Process-wide Upload Index (shared by every Streamlit session & rerun)
+_upload_index = None
+_upload_index_lock = threading.Lock()
+
+
+def get_upload_index():
+    global _upload_index
+
+    if _upload_index is None:
+        with _upload_index_lock:
+            if _upload_index is None:
+                _upload_index = UploadIndex()
+    return _upload_index
+
+
+def upload_key(image_bytes, account_id):
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{account_id}:{digest}"
+
+
+def upload_image_to_storage(
+    image_bytes, filename, api_url, account_id, api_key, content_type="image/jpeg"
+):
+    # Skip the upload if the same bytes already live in Cloudflare Images
+    index = get_upload_index()
+    key = upload_key(image_bytes, account_id)
+
+    image_url = index.get(key)
+    if image_url is None:
+        image_url = upload_image(
+            image_bytes, filename, api_url, account_id, api_key, content_type
+        )
+        index.put(key, image_url)
+    return image_url
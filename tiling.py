@@ -0,0 +1,102 @@
+from PIL import Image, ImageChops
+import math
+import scheduler
+
+
+# Tile Geometry (SD 1.5 native 512px tiles; overlap is cross-faded)
+TILE_SIZE = 512
+OVERLAP = 64
+TILE_BATCH = 2  # tiles in flight per image: bounds activation memory
+MAX_SIDE = 4096  # working resolution cap for tiled mode
+
+
+def axis_positions(length, tile, overlap):
+    # Evenly spread tile starts covering [0, length); overlaps are >= overlap
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def tile_boxes(size, tile=TILE_SIZE, overlap=OVERLAP):
+    # -> [(left, top, right, bottom), ...] row by row
+    width, height = size
+    tile_width, tile_height = min(tile, width), min(tile, height)
+    return [
+        (left, top, left + tile_width, top + tile_height)
+        for top in axis_positions(height, tile_height, overlap)
+        for left in axis_positions(width, tile_width, overlap)
+    ]
+
+
+def feather_mask(size, left=0, top=0):
+    # Opaque tile whose left/top edges ramp in over the pixels shared with
+    # tiles pasted before it (right/bottom neighbours fade in over this one)
+    width, height = size
+    mask = Image.new("L", size, 255)
+    if left:
+        ramp = Image.linear_gradient("L").rotate(90)  # 0 -> 255, left to right
+        mask.paste(ramp.resize((left, height)), (0, 0))
+    if top:
+        top_mask = Image.new("L", size, 255)
+        top_mask.paste(Image.linear_gradient("L").resize((width, top)), (0, 0))
+        mask = ImageChops.multiply(mask, top_mask)
+    return mask
+
+
+def round_to_multiple(image, multiple=8):
+    # The UNet/VAE need sides divisible by 8
+    width, height = image.size
+    size = (
+        max(multiple, width // multiple * multiple),
+        max(multiple, height // multiple * multiple),
+    )
+    return image if size == image.size else image.resize(size, Image.LANCZOS)
+
+
+def cartoonize_tiled(
+    prompt,
+    image,
+    tile=TILE_SIZE,
+    overlap=OVERLAP,
+    batch_size=TILE_BATCH,
+    steps=None,
+    limits=None,
+    progress=None,
+    **options,
+):
+    # Full-resolution output from fixed-size tiles: peak model memory depends
+    # on tile and batch size, not on the photo (only the RGB canvas grows)
+    original_size = image.size
+    image = round_to_multiple(image.convert("RGB"))
+    tile = tile // 8 * 8
+    boxes = tile_boxes(image.size, tile, overlap)
+
+    canvas = Image.new("RGB", image.size)
+    for start in range(0, len(boxes), batch_size):
+        window = boxes[start : start + batch_size]
+        futures = [
+            scheduler.submit(
+                prompt, image.crop(box), steps=steps, limits=limits, **options
+            )
+            for box in window
+        ]
+        for box, future in zip(window, futures):
+            result = scheduler.wait(future)
+            canvas.paste(result, box[:2], _seam_mask(box, boxes, result.size))
+        if progress is not None:
+            progress(min(start + batch_size, len(boxes)), len(boxes))
+
+    return canvas if canvas.size == original_size else canvas.resize(original_size)
+
+
+def _seam_mask(box, boxes, size):
+    # Overlap with the tile to the left (same row) and above (same column)
+    left, top, right, bottom = box
+    shared_left = max(
+        (b[2] - left for b in boxes if b[1] == top and b[0] < left), default=0
+    )
+    shared_top = max(
+        (b[3] - top for b in boxes if b[0] == left and b[1] < top), default=0
+    )
+    return feather_mask(size, max(0, shared_left), max(0, shared_top))
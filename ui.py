@@ -0,0 +1,402 @@
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import admission
+import batch
+import cache
+import history
+import jobs
+import lut
+import math
+import preprocess
+import re
+import results
+import settings
+import streamlit as st
+import time
+import uuid
+
+
+# Rotation Choices (label -> counter-clockwise degrees)
+ROTATIONS = {"None": 0, "Left 90°": 90, "Right 90°": 270}
+
+# URL Query Parameter Holding the Guest Id (apps without a login)
+GUEST_PARAM = "uid"
+
+
+def guest_id():
+    # Apps without a login keep a random guest id in the URL (?uid=...): it
+    # survives reloads and bookmarks, unlike the per-tab session id
+    guest = st.query_params.get(GUEST_PARAM, "")
+    if not re.fullmatch(r"[0-9a-f]{32}", guest):
+        guest = uuid.uuid4().hex
+        st.query_params[GUEST_PARAM] = guest
+    return guest
+
+
+def current_user():
+    # Identity: login name (user_id, set by login()), OAuth account, else the guest id
+    if st.session_state.get("logged_in") and st.session_state.get("user_id"):
+        return f"login:{st.session_state.user_id}"
+    try:
+        if st.experimental_user.is_logged_in:
+            return f"oauth:{st.experimental_user.email}"
+    except Exception:
+        pass  # authentication isn't configured for this app
+    if get_script_run_ctx() is None:
+        return "anonymous"
+    return f"guest:{guest_id()}"
+
+
+def rate_limit_key():
+    # Token bucket owner: the signed-in user; a guest goes by the address the
+    # trusted proxy appended (TRUSTED_PROXIES hops from the right; anything left
+    # of it is client-supplied), else all guests share one bucket (a new ?uid=
+    # must not come with a fresh one)
+    user = current_user()
+    if user.startswith(("login:", "oauth:")):
+        return user
+    config = settings.load_config(".env", ("TRUSTED_PROXIES",))
+    hops = int(config.get("TRUSTED_PROXIES") or 0)
+    forwarded = [
+        address.strip()
+        for address in (st.context.headers.get("X-Forwarded-For") or "").split(",")
+        if address.strip()
+    ]
+    if hops and len(forwarded) >= hops:
+        return f"client:{forwarded[-hops]}"
+    return "guest"
+
+
+def admit_request(cost=1, provider=None):
+    # Per-user token bucket: False (with a notice) when requests come too fast;
+    # when admitted, warn about the expected wait for a busy provider
+    controller = admission.get_controller()
+    retry_after = controller.charge(rate_limit_key(), cost)
+    if retry_after == math.inf:
+        st.warning(
+            f"Too many at once: at most {admission.USER_BURST} images per request."
+        )
+        return False
+    if retry_after:
+        st.warning(f"Too many requests. Please try again in {retry_after:.0f}s.")
+        return False
+
+    wait = controller.estimated_wait(provider) if provider else 0.0
+    if wait:
+        st.caption(
+            f"⏳ {provider} is busy: about {wait:.0f}s before your request starts"
+        )
+    return True
+
+
+def record_result(data, caption, **details):
+    # Store the output (renditions + the user's history) -> result id
+    store = results.get_result_store()
+    result_id = store.put(data)
+    history.get_history_store().record(
+        current_user(),
+        data,
+        caption=caption,
+        thumbnail=store.get(result_id, "thumb"),
+        **details,
+    )
+    return result_id
+
+
+def keep_result(data, caption, key="cartoon", **details):
+    # Record the output and keep it in the session so reruns can re-show it
+    st.session_state[key] = {
+        "id": record_result(data, caption, **details),
+        "caption": caption,
+    }
+
+
+@st.fragment(run_every=0.5)
+def poll_prediction():
+    tracked = st.session_state.get("prediction")
+    job = jobs.get_job_registry().get(tracked["id"]) if tracked else None
+    if job is None:
+        st.session_state.pop("prediction", None)
+        return
+
+    # Poll Prediction Status (only this fragment reruns while waiting)
+    status = job.poll()
+    if status == "succeeded":
+        cartoon = cache.read_result(job.output)
+        cache.get_result_cache().put(tracked["key"], cartoon)
+        keep_result(
+            cartoon,
+            tracked["caption"],
+            latency=time.time() - job.started_at,
+            **tracked["details"],
+        )
+        del st.session_state["prediction"]
+        st.rerun()
+    elif status in ("failed", "canceled"):
+        st.session_state.cartoon_error = job.error or f"Prediction {status}"
+        del st.session_state["prediction"]
+        st.rerun()
+    else:
+        if status == "pending":
+            # Waiting for a free replicate slot behind other sessions (FIFO)
+            position = job.queue_position or 0
+            st.info(
+                f"⏳ #{position + 1} in line, about {job.estimated_wait:.0f}s to start"
+            )
+        else:
+            elapsed = time.time() - job.started_at
+            state = "Processing" if status == "processing" else "Queued"
+            st.info(f"⏳ {state}... ({elapsed:.0f}s)")
+            if job.logs:
+                st.code("\n".join(job.logs.splitlines()[-8:]))
+
+        if st.button("Cancel"):
+            job.cancel()
+            del st.session_state["prediction"]
+            st.rerun()
+
+
+def submit_prediction(client, model, input, key, caption, details=None):
+    # Replace any prediction this session is still waiting on
+    registry = jobs.get_job_registry()
+    st.session_state.pop("cartoon", None)
+    tracked = st.session_state.pop("prediction", None)
+    previous = registry.get(tracked["id"]) if tracked else None
+    if previous is not None:
+        previous.cancel()
+
+    session = get_script_run_ctx()
+    job = jobs.PredictionJob(
+        client,
+        model,
+        input,
+        owner=session.session_id if session else None,
+        user=current_user(),
+    )
+    registry.submit(job)
+    st.session_state.prediction = {
+        "id": job.key,
+        "key": key,
+        "caption": caption,
+        "details": details or {},
+    }
+
+
+def track_prediction():
+    # Poll only while a prediction is pending: an idle session never reruns
+    if "prediction" in st.session_state:
+        poll_prediction()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def prepare_upload(data, rotation=0, aspect_ratio=None, max_side=1024):
+    # Decode/rotate/resize once per upload & options; widget reruns reuse it
+    # (cache_data: every caller gets its own copy, no image shared across sessions)
+    return preprocess.prepare_image(
+        data, rotation=rotation, aspect_ratio=aspect_ratio, max_side=max_side
+    )
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def prepare_full_upload(data, rotation=0, max_side=4096):
+    # Full-resolution input for tiling: tens of MB each, so only keep a couple
+    return preprocess.prepare_image(data, rotation=rotation, max_side=max_side)
+
+
+def show_prepared(prepared, optimized=True):
+    # Send the already-encoded upload bytes: no PIL re-encode on every rerun
+    st.image(prepared.data, caption="Original Image", use_container_width=True)
+    if optimized:
+        st.caption(
+            f"Upload optimized: {prepared.original_size // 1024} KB → "
+            f"{len(prepared.data) // 1024} KB ({prepared.saved_bytes // 1024} KB saved)"
+        )
+
+
+@st.fragment
+def preview_upload(data, key="prepared", max_side=1024, optimized=True):
+    # Rotating reruns only this fragment; the action area reads st.session_state[key]
+    rotation = st.radio(
+        "Rotate your photo, if necessary.", tuple(ROTATIONS), key=f"{key}_rotation"
+    )
+    prepared = prepare_upload(data, rotation=ROTATIONS[rotation], max_side=max_side)
+    show_prepared(prepared, optimized)
+    st.session_state[key] = prepared
+
+
+def render_batch(
+    items, task, caption, columns=3, max_workers=batch.MAX_WORKERS, details=None
+):
+    # Run task over [(name, payload), ...] on a worker pool, filling a grid as items finish;
+    # details(name, payload) -> history fields for each finished item
+    progress = st.progress(0.0, text=f"0 / {len(items)} done")
+    grid = st.columns(columns)
+    slots = [grid[index % columns].empty() for index in range(len(items))]
+    for slot, (name, _) in zip(slots, items):
+        slot.info(f"⏳ {name}")
+
+    outcomes = []
+    for result in batch.run_batch(items, task, max_workers):
+        outcomes.append(result)
+
+        if result.ok:
+            store = results.get_result_store()
+            fields = details(*items[result.index]) if details else {}
+            result_id = record_result(
+                result.data,
+                f"{result.name} · {caption}",
+                latency=result.seconds,
+                **fields,
+            )
+            slots[result.index].image(
+                store.get(result_id, "thumb"),
+                caption=f"{result.name} · {caption} ({result.seconds:.1f}s)",
+                use_container_width=True,
+            )
+        else:
+            slots[result.index].error(f"{result.name}: {result.error}")
+
+        progress.progress(
+            len(outcomes) / len(items), text=f"{len(outcomes)} / {len(items)} done"
+        )
+
+    # Download Whole Batch
+    finished = sorted((r for r in outcomes if r.ok), key=lambda r: r.index)
+    if finished:
+        st.download_button(
+            "Download all (ZIP)",
+            batch.build_zip(finished),
+            file_name="cartoons.zip",
+            mime="application/zip",
+        )
+    return outcomes
+
+
+@st.fragment
+def show_result(result_id, caption, grade=None, key="result"):
+    # Display-size WebP first; the full-resolution original only on demand
+    # (key: widget namespace, so the same result can be shown twice on a page)
+    store = results.get_result_store()
+    if store.get(result_id, "display") is None:
+        st.warning("This result has expired. Please cartoonize it again.")
+        return
+
+    # Color Grade (3D LUT on the stored result: re-grading costs no API call)
+    grades = ("none",) + tuple(lut.GRADES)
+    selected = st.selectbox(
+        "Color grade",
+        grades,
+        index=grades.index(grade) if grade in grades else 0,
+        key=f"{key}-grade-{result_id}",
+    )
+    grade = None if selected == "none" else selected
+
+    display = store.get(result_id, "display", grade)
+    st.image(display, caption=caption, use_container_width=True)
+    if st.toggle("Show full resolution", key=f"{key}-full-{result_id}"):
+        original = store.get(result_id, "original", grade)
+        st.image(original, caption=caption, use_container_width=True)
+        st.download_button(
+            "Download",
+            original,
+            file_name=f"cartoon-{result_id[:8]}.{batch.guess_extension(original)}",
+            key=f"{key}-download-{result_id}",
+        )
+
+
+def follow_generation(future, preview, interval=0.25):
+    # Redraw the latest step preview until the run is done; a widget click
+    # reruns the script and the caller resumes following from session state
+    bar = st.progress(0.0, text="Queued...")
+    image = st.empty()
+    shown = None
+    while not future.done():
+        # Write every pass (queued too): a Stop click can only interrupt the
+        # script at an st.* call
+        if preview.total:
+            state = "Stopping" if preview.stopped else "Step"
+            bar.progress(
+                preview.step / preview.total,
+                text=f"{state} {preview.step}/{preview.total}",
+            )
+        else:
+            bar.progress(0.0, text="Stopping..." if preview.stopped else "Queued...")
+        if preview.image is not None and preview.image is not shown:
+            shown = preview.image
+            image.image(shown, caption="Preview")
+        time.sleep(interval)
+    bar.empty()
+    image.empty()
+
+
+def previous_results(source, columns=4):
+    # Earlier results for this photo/prompt: reopen them instead of paying again
+    entries = history.get_history_store().find(
+        current_user(), history.input_hash(source), limit=columns
+    )
+    if entries:
+        st.caption("Already cartoonized before (reopen it under My history):")
+        grid = st.columns(columns)
+        store = history.get_history_store()
+        for index, entry in enumerate(entries):
+            thumbnail = store.thumbnail(entry["result_id"])
+            if thumbnail is not None:
+                grid[index].image(
+                    thumbnail, caption=entry["style"], use_container_width=True
+                )
+
+
+@st.fragment
+def history_gallery(columns=3, page_size=history.PAGE_SIZE):
+    # Newest first, one page at a time: only the visible page's rows and
+    # thumbnails are read; the original loads when an entry is opened
+    store = history.get_history_store()
+    user = current_user()
+    total = store.count(user)
+    if not total:
+        st.caption("No results yet.")
+        return
+
+    opened = st.session_state.get("history_opened")
+    if opened is not None:
+        data = store.output(opened["result_id"])
+        if data is None:
+            st.warning("This result is no longer stored.")
+        else:
+            show_result(
+                results.get_result_store().put(data), opened["caption"], key="history"
+            )
+        if st.button("Close", key="history-close"):
+            del st.session_state["history_opened"]
+            st.rerun(scope="fragment")
+
+    cursors = st.session_state.setdefault("history_cursors", [None])
+    entries, following = store.page(user, cursors[-1], page_size)
+    grid = st.columns(columns)
+    for index, entry in enumerate(entries):
+        with grid[index % columns]:
+            thumbnail = store.thumbnail(entry["result_id"])
+            if thumbnail is not None:
+                st.image(thumbnail, use_container_width=True)
+            created = time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(entry["created_at"])
+            )
+            latency = f" · {entry['latency']:.1f}s" if entry["latency"] else ""
+            st.caption(
+                f"{entry['caption'] or entry['style']}  \n"
+                f"{entry['provider'] or 'unknown'}{latency} · {created}"
+            )
+            if st.button("Open", key=f"history-open-{entry['id']}"):
+                st.session_state.history_opened = entry
+                st.rerun(scope="fragment")
+
+    # Pager (a stack of keyset cursors: back = pop, forward = push)
+    newer, position, older = st.columns([1, 2, 1])
+    if newer.button("← Newer", disabled=len(cursors) == 1, key="history-newer"):
+        cursors.pop()
+        st.rerun(scope="fragment")
+    position.caption(
+        f"Page {len(cursors)} of {math.ceil(total / page_size)} ({total} results)"
+    )
+    if older.button("Older →", disabled=following is None, key="history-older"):
+        cursors.append(following)
+        st.rerun(scope="fragment")